@@ -9,8 +9,66 @@ DB_CONFIG = {
     "password": "password",
     "database": "database name "
 }
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", 30))
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", 16))
+WORKFLOW_RECONCILE_INTERVAL = float(os.getenv("WORKFLOW_RECONCILE_INTERVAL", 300))
+WORKFLOW_CLAIM_BATCH_SIZE = int(os.getenv("WORKFLOW_CLAIM_BATCH_SIZE", 50))
+WORKFLOW_RESEND_TIMEOUT = float(os.getenv("WORKFLOW_RESEND_TIMEOUT", 300))
+WORKFLOW_RESEND_MAX_ATTEMPTS = int(os.getenv("WORKFLOW_RESEND_MAX_ATTEMPTS", 3))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 5))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", 3600))
+OUTBOX_MAX_IDLE_WAIT = float(os.getenv("OUTBOX_MAX_IDLE_WAIT", 300))
+OUTBOX_MIN_WAIT = float(os.getenv("OUTBOX_MIN_WAIT", 0.5))
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", 5000))
+FANOUT_JOB_POLL_INTERVAL = float(os.getenv("FANOUT_JOB_POLL_INTERVAL", 60))
+FANOUT_JOB_STALE_AFTER = float(os.getenv("FANOUT_JOB_STALE_AFTER", 300))
+FANOUT_JOB_MAX_ATTEMPTS = int(os.getenv("FANOUT_JOB_MAX_ATTEMPTS", 10))
+FANOUT_RETRY_BASE_SECONDS = float(os.getenv("FANOUT_RETRY_BASE_SECONDS", 5))
+FANOUT_RETRY_MAX_SECONDS = float(os.getenv("FANOUT_RETRY_MAX_SECONDS", 3600))
+SCREENSHOT_RECONCILE_INTERVAL = float(os.getenv("SCREENSHOT_RECONCILE_INTERVAL", 300))
+SCREENSHOT_RETRY_BASE_SECONDS = float(os.getenv("SCREENSHOT_RETRY_BASE_SECONDS", 0.5))
+SCREENSHOT_RETRY_MAX_SECONDS = float(os.getenv("SCREENSHOT_RETRY_MAX_SECONDS", 30))
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", 300))
+DEVICE_CACHE_MAXSIZE = int(os.getenv("DEVICE_CACHE_MAXSIZE", 50000))
+AUDIENCE_REFRESH_INTERVAL = float(os.getenv("AUDIENCE_REFRESH_INTERVAL", 10))
+AUDIENCE_REBUILD_INTERVAL = float(os.getenv("AUDIENCE_REBUILD_INTERVAL", 3600))
+LDAP_SERVER = "Your LDAP server"
+LDAP_PORT = int(os.getenv("LDAP_PORT", 389))
+LDAP_BASE_DN = "dc=example,dc=com"
+LDAP_USER_DN = "ou=users"
+LDAP_BIND_DN = "cn=admin,dc=example,dc=com"
+LDAP_BIND_PASSWORD = "password"
+LDAP_POOL_MAX_SIZE = int(os.getenv("LDAP_POOL_MAX_SIZE", 5))
+LDAP_POOL_TIMEOUT = float(os.getenv("LDAP_POOL_TIMEOUT", 10))
+LDAP_POOL_HEALTH_CHECK_AFTER = float(os.getenv("LDAP_POOL_HEALTH_CHECK_AFTER", 30))
+LDAP_BIND_POOL_MAX_SIZE = int(os.getenv("LDAP_BIND_POOL_MAX_SIZE", 10))
+LDAP_BIND_POOL_MAX_IDLE = float(os.getenv("LDAP_BIND_POOL_MAX_IDLE", 60))
+CONTACT_MIRROR_REFRESH_INTERVAL = float(os.getenv("CONTACT_MIRROR_REFRESH_INTERVAL", 30))
+CONTACT_MIRROR_REBUILD_INTERVAL = float(os.getenv("CONTACT_MIRROR_REBUILD_INTERVAL", 3600))
+CONTACT_LDAP_PAGE_SIZE = int(os.getenv("CONTACT_LDAP_PAGE_SIZE", 500))
+CREDENTIAL_IO_WORKERS = int(os.getenv("CREDENTIAL_IO_WORKERS", 8))
+CREDENTIAL_IO_MAX_QUEUE = int(os.getenv("CREDENTIAL_IO_MAX_QUEUE", 64))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", 2))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", 32))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", 30))
+ACK_FLUSH_INTERVAL = float(os.getenv("ACK_FLUSH_INTERVAL", 0.05))
+ACK_FLUSH_MAX_ROWS = int(os.getenv("ACK_FLUSH_MAX_ROWS", 1000))
+ACK_BUFFER_MAX_ROWS = int(os.getenv("ACK_BUFFER_MAX_ROWS", ACK_FLUSH_MAX_ROWS * 50))
+PROGRESS_QUEUE_SIZE = int(os.getenv("PROGRESS_QUEUE_SIZE", 100))
+PROGRESS_RESYNC_INTERVAL = float(os.getenv("PROGRESS_RESYNC_INTERVAL", 15))
+RUN_BACKGROUND_WORKERS = os.getenv("RUN_BACKGROUND_WORKERS", "true").lower() == "true"
 GCP_PROJECT_ID = "Your Project ID"
 PUBSUB_TOPIC = "Topic Name"
+PUBSUB_BATCH_MAX_MESSAGES = int(os.getenv("PUBSUB_BATCH_MAX_MESSAGES", 1000))
+PUBSUB_BATCH_MAX_BYTES = int(os.getenv("PUBSUB_BATCH_MAX_BYTES", 1024 * 1024 * 9))
+PUBSUB_BATCH_MAX_LATENCY = float(os.getenv("PUBSUB_BATCH_MAX_LATENCY", 0.05))
+PUBSUB_MAX_OUTSTANDING_MESSAGES = int(os.getenv("PUBSUB_MAX_OUTSTANDING_MESSAGES", 20000))
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
 
@@ -1,10 +1,10 @@
 import uuid
 import os
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from helpers.auth_helper import get_current_user
 from helpers.notification_helper import get_db_connection
 from models.faq_model import FAQCreateRequest, FAQSearchRequest
 
@@ -14,10 +14,10 @@ router = APIRouter(
 )
 
 @router.get("/")
-def get_all_faqs(request: Request):
+def get_all_faqs(request: Request, principal: dict = Depends(get_current_user)):
+    conn = None
+    cursor = None
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -38,14 +38,16 @@ def get_all_faqs(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
 @router.get("/{faq_id}")
-def get_faq_by_id(faq_id: int, request: Request):
+def get_faq_by_id(faq_id: int, request: Request, principal: dict = Depends(get_current_user)):
+    conn = None
+    cursor = None
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -65,20 +67,22 @@ def get_faq_by_id(faq_id: int, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
 @router.post("/search")
-def search_faqs(query: FAQSearchRequest, request: Request):
+def search_faqs(query: FAQSearchRequest, request: Request, principal: dict = Depends(get_current_user)):
+    if not query.query:
+        return get_all_faqs(request, principal)
+
+    conn = None
+    cursor = None
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        if not query.query:
-            return get_all_faqs(request)
-        
         search_query = f"%{query.query.lower()}%"
         cursor.execute(
             "SELECT id, question, answer, search_count FROM faqs WHERE LOWER(question) LIKE %s OR LOWER(answer) LIKE %s ORDER BY search_count DESC",
@@ -105,15 +109,14 @@ def search_faqs(query: FAQSearchRequest, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
 @router.post("/submit")
-def submit_question(data: FAQCreateRequest, request: Request):
+def submit_question(data: FAQCreateRequest, request: Request, principal: dict = Depends(get_current_user)):
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        
         # Send email notification
         send_email_notification(data.question)
         
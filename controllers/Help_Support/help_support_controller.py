@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from models.support_model import SupportRequest
 from helpers.email_helper import send_email
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from helpers.auth_helper import get_current_user
 
 
 router = APIRouter(
@@ -14,12 +14,10 @@ support_requests = []
 
 @router.post("/submit", response_model=dict)
 def submit_support_request(
-    data: SupportRequest, request: Request
+    data: SupportRequest, request: Request,
+    principal: dict = Depends(get_current_user)
 ):
     """Submit a support request with authentication."""
-    token = extract_token_from_cookies(request)
-    verify_jwt(token)  # Ensure user is authenticated
-
     new_request = {
         "id": len(support_requests) + 1,
         "first_name": data.first_name,
@@ -40,9 +38,6 @@ def submit_support_request(
     return {"message": "Support request submitted successfully", "request": new_request}
 
 @router.get("/", response_model=list)
-def get_all_support_requests(request: Request):
+def get_all_support_requests(request: Request, principal: dict = Depends(get_current_user)):
     """Retrieve all submitted support requests (Authenticated users only)."""
-    token = extract_token_from_cookies(request)
-    verify_jwt(token)  # Ensure user is authenticated
-
     return support_requests
\ No newline at end of file
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from helpers.auth_helper import  authenticate_user_ldap, create_access_token
+from helpers.credential_helper import credential_executor
 
 router = APIRouter(
     prefix="/auth/login",
@@ -16,7 +17,7 @@ async def login(response: Response, form_data: OAuth2PasswordRequestForm = Depen
         if not username or not password:
             raise HTTPException(status_code=400, detail="Username and password are required.")
 
-        if authenticate_user_ldap(username, password):
+        if await credential_executor.run(authenticate_user_ldap, username, password):
             access_token = create_access_token(data={"sub": username})
             
             response.set_cookie(
@@ -33,7 +34,9 @@ async def login(response: Response, form_data: OAuth2PasswordRequestForm = Depen
             }
         else:
             raise HTTPException(status_code=401, detail="Authentication failed.")
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in login API: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while processing the request.")
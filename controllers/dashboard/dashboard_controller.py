@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from datetime import datetime
 from typing import Optional
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from helpers.auth_helper import get_current_user
+from helpers.dashboard_helper import BREAKDOWN_COLUMNS, LATENCY_GROUPS, SECTION_FILTERS, get_ack_latency, get_breakdown, get_high_priority_counts, get_section_counts, get_summary_counts
 from helpers.notification_helper import get_db_connection
 import logging
 
@@ -19,47 +21,10 @@ def execute_query(cursor, query: str, params: Optional[tuple] = None):
     return cursor.fetchone()
 
 @router.get("/stats")
-def get_summary(request: Request):
+def get_summary(request: Request, principal: dict = Depends(get_current_user)):
     try:
-        # Extract and verify JWT token
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-
-        # Connect to the database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Queries for different stats
-        queries = {
-            "all_time": "SELECT COUNT(*) FROM device_workflows;",
-            "daily": """
-                SELECT COUNT(*)
-                FROM device_workflows dw
-                JOIN workflow w ON dw.workflow_id = w.unique_id
-                WHERE w.time >= CURRENT_DATE;
-            """,
-            "weekly": """
-                SELECT COUNT(*)
-                FROM device_workflows dw
-                JOIN workflow w ON dw.workflow_id = w.unique_id
-                WHERE DATE_TRUNC('week', w.time) = DATE_TRUNC('week', CURRENT_DATE);
-            """,
-            "monthly": """
-                SELECT COUNT(*)
-                FROM device_workflows dw
-                JOIN workflow w ON dw.workflow_id = w.unique_id
-                WHERE DATE_TRUNC('month', w.time) = DATE_TRUNC('month', CURRENT_DATE);
-            """,
-            "scheduled": """
-                SELECT COUNT(*)
-                FROM device_workflows dw
-                JOIN workflow w ON dw.workflow_id = w.unique_id
-                WHERE w.workflow_type = 'scheduled';
-            """
-        }
-
-        # Execute queries and fetch results
-        results = {key: execute_query(cursor, query)[0] for key, query in queries.items()}
+        # All sections come from one aggregate pass, cached briefly
+        results = get_summary_counts()
 
         return {
             "sections": {
@@ -74,50 +39,14 @@ def get_summary(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
-
 @router.get("/stats/view")
-def get_section_details(request: Request, section: str = Query(...)):
+def get_section_details(request: Request, section: str = Query(...), principal: dict = Depends(get_current_user)):
     try:
-        # Extract and verify JWT token
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-
-        # Connect to the database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Mapping section to filter conditions
-        filter_conditions = {
-            "all_time": "",
-            "daily": "JOIN workflow w ON dw.workflow_id = w.unique_id WHERE w.time >= CURRENT_DATE",
-            "weekly": "JOIN workflow w ON dw.workflow_id = w.unique_id WHERE DATE_TRUNC('week', w.time) = DATE_TRUNC('week', CURRENT_DATE)",
-            "monthly": "JOIN workflow w ON dw.workflow_id = w.unique_id WHERE DATE_TRUNC('month', w.time) = DATE_TRUNC('month', CURRENT_DATE)",
-            "scheduled": "JOIN workflow w ON dw.workflow_id = w.unique_id WHERE w.workflow_type = 'scheduled'",
-        }
-
-        if section not in filter_conditions:
+        if section not in SECTION_FILTERS:
             raise HTTPException(status_code=400, detail="Invalid section value")
 
-        filter_condition = filter_conditions[section]
-
-        # Total Acknowledgements
-        total_ack_query = f"""
-            SELECT COUNT(*)
-            FROM device_workflows dw
-            {filter_condition};
-        """
-        total_acknowledgements = execute_query(cursor, total_ack_query)[0] or 0
-
-        # Failed Acknowledgements
-        failed_query = f"""
-            SELECT COUNT(*)
-            FROM device_workflows dw
-            {filter_condition} {"AND dw.ack = FALSE" if filter_condition else "WHERE dw.ack = FALSE"};
-        """
-        failed_count = execute_query(cursor, failed_query)[0] or 0
+        # Total and failed acknowledgements in one pass
+        total_acknowledgements, failed_count = get_section_counts(section)
 
         # Compute rates
         failed_rate = (failed_count / total_acknowledgements) * 100 if total_acknowledgements > 0 else 0
@@ -135,18 +64,11 @@ def get_section_details(request: Request, section: str = Query(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
-
 @router.get("/engagement/response_time")
-def get_average_response_time(request: Request):
+def get_average_response_time(request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         # Query for average response time using workflow time and acknowledged time
         query = """
@@ -173,28 +95,36 @@ def get_average_response_time(request: Request):
         cursor.close()
         conn.close()
 
-@router.get("/engagement/acknowledgment_breakdown")
-def get_acknowledgment_breakdown(request: Request, filter_by: str = Query(...)):
+@router.get("/engagement/response_time/percentiles")
+def get_response_time_percentiles(
+    request: Request,
+    group_by: Optional[str] = None,
+    time_from: Optional[datetime] = None,
+    time_to: Optional[datetime] = None,
+    priority: Optional[str] = None,
+    division: Optional[str] = None,
+    principal: dict = Depends(get_current_user)
+):
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
+        if group_by is not None and group_by not in LATENCY_GROUPS:
+            raise HTTPException(status_code=400, detail="Invalid group_by value")
+
+        # Percentiles (in seconds) come from merged per-hour sketches
+        percentiles = get_ack_latency(group_by, time_from, time_to, priority, division)
+
+        return {"response_time_percentiles": percentiles}
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    except Exception as e:
+        logger.error(f"Error in get_response_time_percentiles: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        valid_filters = ["device_type", "division"]
-        if filter_by not in valid_filters:
+@router.get("/engagement/acknowledgment_breakdown")
+def get_acknowledgment_breakdown(request: Request, filter_by: str = Query(...), principal: dict = Depends(get_current_user)):
+    try:
+        if filter_by not in BREAKDOWN_COLUMNS:
             raise HTTPException(status_code=400, detail="Invalid filter value")
 
-        query = f"""
-            SELECT d.{filter_by}, COUNT(*) AS total, 
-            SUM(CASE WHEN dw.ack = FALSE THEN 1 ELSE 0 END) AS failed
-            FROM device_workflows dw
-            JOIN devices d ON dw.device_id = d.device_id
-            GROUP BY d.{filter_by};
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
+        results = get_breakdown(filter_by)
 
         breakdown = []
         for row in results:
@@ -214,30 +144,10 @@ def get_acknowledgment_breakdown(request: Request, filter_by: str = Query(...)):
         logger.error(f"Error in get_acknowledgment_breakdown: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
-
 @router.get("/engagement/acknowledgment_breakdown/high_priority")
-def get_high_priority_stats(request: Request):
+def get_high_priority_stats(request: Request, principal: dict = Depends(get_current_user)):
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query = """
-            SELECT COUNT(*),
-            SUM(CASE WHEN dw.ack = FALSE THEN 1 ELSE 0 END) AS failed
-            FROM device_workflows dw
-            JOIN workflow w ON dw.workflow_id = w.unique_id
-            WHERE w.priority = 'high';
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
-        total_high_priority = result[0] or 0
-        failed_high_priority = result[1] or 0
+        total_high_priority, failed_high_priority = get_high_priority_counts()
 
         failed_rate = (failed_high_priority / total_high_priority) * 100 if total_high_priority > 0 else 0
         success_rate = 100 - failed_rate
@@ -253,7 +163,3 @@ def get_high_priority_stats(request: Request):
     except Exception as e:
         logger.error(f"Error in get_high_priority_stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-
-    finally:
-        cursor.close()
-        conn.close()
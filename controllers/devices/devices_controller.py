@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Request
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from fastapi import APIRouter, Depends, HTTPException, Request
+from helpers.auth_helper import get_current_user
 from helpers.notification_helper import get_db_connection
 
 router = APIRouter(
@@ -8,12 +8,10 @@ router = APIRouter(
 )
 
 @router.get("/")
-def get_all_devices(request: Request):
+def get_all_devices(request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         cursor.execute("SELECT device_id, OS_type , device_type FROM devices")
         devices = cursor.fetchall()
@@ -1,6 +1,8 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Request
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from fastapi import APIRouter, Depends, HTTPException, Request
+from helpers.auth_helper import get_current_user
+from helpers.audience_index import audience_index
+from helpers.device_registry import device_registry
 from helpers.notification_helper import get_db_connection
 from models.notification_model import DivisionCreateRequest
 router = APIRouter(
@@ -9,13 +11,11 @@ router = APIRouter(
 )
 
 @router.post("/create")
-def create_division(division: DivisionCreateRequest, request: Request):
+def create_division(division: DivisionCreateRequest, request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
         divisions_id = str(uuid.uuid4())
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         cursor.execute(
             """
@@ -36,6 +36,8 @@ def create_division(division: DivisionCreateRequest, request: Request):
             )
 
         conn.commit()
+        device_registry.invalidate()
+        audience_index.invalidate()
 
         return {"message": "Division created successfully", "division_id": division_id}
 
@@ -49,12 +51,10 @@ def create_division(division: DivisionCreateRequest, request: Request):
             conn.close()
 
 @router.get("/")
-def get_all_divisions(request: Request):
+def get_all_divisions(request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         cursor.execute("SELECT division_id, division_name FROM divisions")
         divisions = cursor.fetchall()
@@ -74,12 +74,10 @@ def get_all_divisions(request: Request):
         conn.close()
 
 @router.get("/unassigned-devices")
-def get_unassigned_users(request: Request):
+def get_unassigned_users(request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         cursor.execute("""
         SELECT d.device_id, d.OS_type
@@ -1,7 +1,19 @@
-from fastapi import APIRouter, HTTPException, Request
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
-from helpers.notification_helper import fetch_workflow_records, format_workflow_records, get_db_connection, get_target_devices, insert_device_workflows, insert_workflow
-from models.notification_model import Notification_type, Workflow, WorkflowUpdate
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from config import WORKFLOW_RESEND_MAX_ATTEMPTS, WORKFLOW_RESEND_TIMEOUT
+from helpers.ack_helper import ack_buffer
+from helpers.audience_index import audience_index, resolve_audience_target
+from helpers.auth_helper import get_current_user
+from helpers.cursor_helper import decode_cursor, encode_cursor
+from helpers.dashboard_helper import invalidate_dashboard_cache
+from helpers.progress_helper import progress_hub
+from helpers.rollup_helper import rollup_workflow
+from helpers.notification_helper import create_fanout_job, fetch_dead_letters, fetch_fanout_job, fetch_workflow_acks, fetch_workflow_records, format_workflow_records, get_db_connection, insert_target_devices, insert_workflow, notify_workflow_changed, resend_unacked
+from models.notification_model import AudiencePreviewRequest, DeviceAck, DeviceAckBatch, Notification_type, Workflow, WorkflowUpdate
 
 router = APIRouter(
     prefix="/api/workflow",
@@ -9,20 +21,26 @@ router = APIRouter(
 )
 
 @router.post("/send-workflows")
-def create_workflow(workflow: Workflow, request: Request):
+def create_workflow(workflow: Workflow, request: Request, response: Response, background: bool = Query(False), principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        resolve_audience_target(workflow)
 
-        workflow_id = insert_workflow(cursor, workflow)
+        if background:
+            workflow_id = insert_workflow(cursor, workflow, fanout_pending=True)
+            job_id = create_fanout_job(cursor, workflow_id, workflow)
+            conn.commit()
+            response.status_code = 202
+            return {"message": "workflow fan-out queued", "workflow_id": workflow_id, "job_id": job_id}
 
-        target_devices = get_target_devices(cursor, workflow)
+        workflow_id = insert_workflow(cursor, workflow)
 
-        insert_device_workflows(cursor, workflow_id, target_devices)
+        insert_target_devices(cursor, workflow_id, workflow)
+        rollup_workflow(cursor, workflow_id)
 
         conn.commit()
+        invalidate_dashboard_cache()
         return {"message": "workflow created successfully", "workflow_id": workflow_id}
 
     except Exception as e:
@@ -33,22 +51,73 @@ def create_workflow(workflow: Workflow, request: Request):
         cursor.close()
         conn.close()
 
+@router.post("/audience/preview")
+def preview_audience(preview: AudiencePreviewRequest, request: Request, principal: dict = Depends(get_current_user)):
+    try:
+        return {"recipients": audience_index.count(preview.audience)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+def get_fanout_job(job_id: str, request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+
+        job = fetch_fanout_job(cursor, job_id)
+
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return job
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
 @router.get("/workflows/history")
-def get_workflow_history(request: Request):
+def get_workflow_history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    notification_type: Optional[str] = None,
+    published: Optional[bool] = None,
+    time_from: Optional[datetime] = None,
+    time_to: Optional[datetime] = None,
+    principal: dict = Depends(get_current_user)
+):
+    after = decode_cursor(page_cursor, datetime.fromisoformat, str) if page_cursor else None
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
-        records = fetch_workflow_records(cursor)
+        records = fetch_workflow_records(
+            cursor,
+            limit=limit,
+            after=after,
+            status=status,
+            priority=priority,
+            notification_type=notification_type,
+            published=published,
+            time_from=time_from,
+            time_to=time_to
+        )
 
-        if not records:
+        if not records and page_cursor is None:
             raise HTTPException(status_code=404, detail="No workflows found")
 
         workflows = format_workflow_records(records)
+        next_cursor = encode_cursor(records[-1][3].isoformat(), records[-1][0]) if len(records) == limit else None
 
-        return {"workflows": workflows}
+        return {"workflows": workflows, "next_cursor": next_cursor}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -57,13 +126,12 @@ def get_workflow_history(request: Request):
         conn.close()
 
 @router.delete("/workflows/{workflow_id}")
-def delete_workflow(workflow_id: str, request: Request):
-    token = extract_token_from_cookies(request)
-    verify_jwt(token)
+def delete_workflow(workflow_id: str, request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
+        rollup_workflow(cursor, workflow_id, sign=-1)
         cursor.execute("DELETE FROM device_workflows WHERE workflow_id = %s", (workflow_id,))
         cursor.execute("DELETE FROM workflow WHERE unique_id = %s RETURNING unique_id", (workflow_id,))
         deleted_id = cursor.fetchone()
@@ -72,6 +140,7 @@ def delete_workflow(workflow_id: str, request: Request):
             raise HTTPException(status_code=404, detail="workflow not found")
 
         conn.commit()
+        invalidate_dashboard_cache()
 
         return {"message": "workflow deleted successfully", "workflow_id": workflow_id}
 
@@ -83,16 +152,13 @@ def delete_workflow(workflow_id: str, request: Request):
         conn.close()
 
 @router.put("/workflows/{workflow_id}")
-async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, request: Request):
+async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, request: Request, principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
         cursor.execute(
-            "SELECT published, notification_type FROM workflow WHERE unique_id = %s",
+            "SELECT published, notification_type, fanout_pending FROM workflow WHERE unique_id = %s",
             (workflow_id,)
         )
         result = cursor.fetchone()
@@ -106,6 +172,16 @@ async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, req
                 detail="Cannot update a workflow that has already been published"
             )
 
+        if result[2]:
+            raise HTTPException(
+                status_code=409,
+                detail="Cannot update a workflow while its recipients are still being prepared"
+            )
+
+        # Uncount the workflow now and count it again after the update, since its time,
+        # priority, type or recipients may change.
+        rollup_workflow(cursor, workflow_id, sign=-1)
+
         update_fields = []
         update_values = []
         
@@ -148,19 +224,19 @@ async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, req
                     (workflow_id,)
                 )
                 
+                resolve_audience_target(workflow_update)
+
                 if workflow_update.ids is None and new_notification_type in [Notification_type.SELECT, Notification_type.GROUP]:
                     raise HTTPException(
                         status_code=400,
                         detail=f"'ids' must be provided when notification type is {new_notification_type}"
                     )
                 
-                target_devices = get_target_devices(cursor, WorkflowUpdate(
+                insert_target_devices(cursor, workflow_id, WorkflowUpdate(
                     NotificationType=new_notification_type,
                     ids=workflow_update.ids
                 ))
                 
-                insert_device_workflows(cursor, workflow_id, target_devices)
-                
                 update_fields.append("notification_type = %s")
                 update_values.append(
                     "Single" if new_notification_type == Notification_type.SELECT and len(workflow_update.ids or []) == 1
@@ -183,9 +259,12 @@ async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, req
         
         update_values.append(workflow_id)
         cursor.execute(query, tuple(update_values))
-        
         updated_workflow = cursor.fetchone()
+        rollup_workflow(cursor, workflow_id)
+
+        notify_workflow_changed(cursor, workflow_id)
         conn.commit()
+        invalidate_dashboard_cache()
 
         return {
             "message": "Workflow updated successfully",
@@ -214,38 +293,139 @@ async def update_workflow(workflow_id: str, workflow_update: WorkflowUpdate, req
 
 
 @router.get("/workflows/{workflow_id}/acks")
-def get_workflow_acks(workflow_id: str, request: Request):
+def get_workflow_acks(
+    workflow_id: str,
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    acked: Optional[bool] = None
+):
+    after = decode_cursor(page_cursor) if page_cursor else None
+    conn = get_db_connection()
+    cursor = conn.cursor()
     try:
         # token = extract_token_from_cookies(request)
         # verify_jwt(token)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT dw.device_id, dw.ack, d.os_type
-            FROM device_workflows dw
-            JOIN devices d ON dw.device_id = d.device_id
-            WHERE dw.workflow_id = %s
-        """, (workflow_id,))
-        
-        acks = cursor.fetchall()
-        
-        if not acks:
-            raise HTTPException(status_code=404, detail="No acknowledgements found for this workflow")
+
+        cursor.execute(
+            "SELECT recipients_total, recipients_acked FROM workflow WHERE unique_id = %s",
+            (workflow_id,)
+        )
+        counts = cursor.fetchone()
+
+        if not counts:
+            raise HTTPException(status_code=404, detail="Workflow not found")
+
+        acks = fetch_workflow_acks(cursor, workflow_id, limit=limit, after=after, acked=acked)
+        next_cursor = encode_cursor(acks[-1][0]) if len(acks) == limit else None
 
         return {
+            "total": counts[0],
+            "acked": counts[1],
             "acks": [
                 {
                     "device_id": ack[0],
                     "acknowledged": ack[1],
                     "device_name": f"{ack[2]} {ack[0]}"
                 } for ack in acks
-            ]
+            ],
+            "next_cursor": next_cursor
         }
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@router.post("/acks", status_code=202)
+async def acknowledge_workflows(acks: Union[DeviceAckBatch, DeviceAck]):
+    # Acks are buffered and written in batches a few milliseconds later; re-sending an
+    # ack that was already recorded is harmless.
+    items = acks.acks if isinstance(acks, DeviceAckBatch) else [acks]
+    accepted = ack_buffer.add([(ack.workflow_id, ack.device_id) for ack in items])
+    return {"message": "acknowledgements accepted", "accepted": accepted}
+
+@router.post("/workflows/{workflow_id}/resend")
+def resend_workflow(
+    workflow_id: str,
+    request: Request,
+    timeout: float = Query(WORKFLOW_RESEND_TIMEOUT, ge=0),
+    max_attempts: int = Query(WORKFLOW_RESEND_MAX_ATTEMPTS, ge=1),
+    principal: dict = Depends(get_current_user)
+):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+
+        cursor.execute("SELECT published FROM workflow WHERE unique_id = %s", (workflow_id,))
+        result = cursor.fetchone()
+
+        if not result:
+            raise HTTPException(status_code=404, detail="Workflow not found")
+
+        if not result[0]:
+            raise HTTPException(status_code=400, detail="Cannot re-send a workflow that has not been published")
+
+        queued = resend_unacked(cursor, workflow_id, timeout=timeout, max_attempts=max_attempts)
+        conn.commit()
+
+        return {"message": "unacknowledged notifications queued for re-send", "workflow_id": workflow_id, "queued": queued}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+@router.get("/workflows/{workflow_id}/progress")
+async def stream_workflow_progress(workflow_id: str, request: Request, principal: dict = Depends(get_current_user)):
+
+    queue = await progress_hub.subscribe(workflow_id)
+
+    # Server-Sent Events: one "data:" line per change. Counters are reloaded when the
+    # resync deadline passes, however many local events arrived meanwhile; an idle
+    # stream gets a keep-alive at the same points.
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                due_in = progress_hub.resync_due_in(workflow_id)
+                if due_in <= 0:
+                    await progress_hub.resync(workflow_id)
+                    continue
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=due_in)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            progress_hub.unsubscribe(workflow_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/outbox/dead-letters")
+def get_dead_letters(request: Request, workflow_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), principal: dict = Depends(get_current_user)):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+
+        dead_letters = fetch_dead_letters(cursor, workflow_id, limit)
+
+        return {"dead_letters": dead_letters}
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -1,4 +1,4 @@
-from helpers.auth_helper import extract_token_from_cookies, verify_jwt
+from helpers.auth_helper import get_current_user
 from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter(
@@ -9,8 +9,7 @@ router = APIRouter(
 @router.get("/validate")
 def validate_user(request: Request):
     try:
-        token = extract_token_from_cookies(request)
-        verify_jwt(token)
+        get_current_user(request)
         return {"message": "User is valid"}
     except Exception as e:
-        raise HTTPException(status_code=401, detail="Invalid or missing token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid or missing token")
@@ -0,0 +1,157 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from psycopg2.extras import execute_values
+from config import ACK_BUFFER_MAX_ROWS, ACK_FLUSH_INTERVAL, ACK_FLUSH_MAX_ROWS
+from helpers.dashboard_helper import invalidate_dashboard_cache
+from helpers.notification_helper import get_db_connection
+from helpers.progress_helper import progress_hub
+from helpers.rollup_helper import apply_rollup_delta, record_ack_latencies
+
+logger = logging.getLogger(__name__)
+
+# Rows acknowledged by the current flush, as a predicate for the rollup helpers
+_FLUSHED_ROWS = "(dw.workflow_id, dw.device_id) IN (SELECT * FROM unnest(%s::varchar[], %s::varchar[]))"
+
+
+class AckBuffer:
+    """Buffers device acks in memory and writes them in set-based batches.
+
+    Acks are keyed by (workflow_id, device_id), so repeats within a batch collapse
+    to the earliest one, and the flush only touches rows that are not acked yet,
+    so a device retrying an ack never moves acknowledged_at or double counts it.
+    A flush runs every ACK_FLUSH_INTERVAL seconds, or as soon as ACK_FLUSH_MAX_ROWS
+    acks are waiting.
+
+    At most ACK_BUFFER_MAX_ROWS acks are held, counting a batch that is being
+    flushed. While the database is down, failed batches are put back; once the
+    buffer is full, new acks are refused with a 503 so devices retry later and the
+    buffer cannot grow without limit.
+    """
+
+    def __init__(self, flush_interval=ACK_FLUSH_INTERVAL, max_rows=ACK_FLUSH_MAX_ROWS, capacity=ACK_BUFFER_MAX_ROWS):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._flushing = 0  # size of the batch currently being written
+        self._thread = None
+        self.received = 0
+        self.rejected = 0
+        self.applied = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ack-flusher", daemon=True)
+            self._thread.start()
+
+    def add(self, acks):
+        """Queue (workflow_id, device_id) pairs acknowledged now; returns how many were queued."""
+        acknowledged_at = datetime.now(timezone.utc)
+        with self._lock:
+            self._ensure_started()
+            if len(self._pending) + self._flushing + len(acks) > self.capacity:
+                self.rejected += len(acks)
+                raise HTTPException(status_code=503, detail="Acknowledgement buffer is full. Please retry shortly.")
+            for workflow_id, device_id in acks:
+                self._pending.setdefault((workflow_id, device_id), acknowledged_at)
+            self.received += len(acks)
+            full = len(self._pending) >= self.max_rows
+        if full:
+            self._wakeup.set()
+        return len(acks)
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushing = len(batch)
+        return batch
+
+    def _restore(self, batch):
+        with self._lock:
+            for key, acknowledged_at in batch.items():
+                self._pending.setdefault(key, acknowledged_at)
+            self._flushing = 0
+
+    def flush(self):
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                acked = self._apply(batch)
+            except Exception:
+                self._restore(batch)
+                with self._lock:
+                    self.failures += 1
+                raise
+            with self._lock:
+                self._flushing = 0
+                self.applied += len(acked)
+                self.flushes += 1
+        if acked:
+            invalidate_dashboard_cache()
+            progress_hub.publish_acks(acked)
+        return len(acked)
+
+    def _apply(self, batch):
+        rows = [(workflow_id, device_id, acknowledged_at) for (workflow_id, device_id), acknowledged_at in batch.items()]
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                updated = execute_values(cursor, """
+                    UPDATE device_workflows dw
+                    SET ack = TRUE, acknowledged_at = a.acknowledged_at
+                    FROM (VALUES %s) AS a(workflow_id, device_id, acknowledged_at)
+                    WHERE dw.workflow_id = a.workflow_id
+                    AND dw.device_id = a.device_id
+                    AND dw.ack IS NOT TRUE
+                    RETURNING dw.workflow_id, dw.device_id
+                """, rows, template="(%s, %s, %s::timestamptz)", page_size=len(rows), fetch=True)
+
+                if updated:
+                    params = ([workflow_id for workflow_id, _ in updated], [device_id for _, device_id in updated])
+                    cursor.execute("""
+                        UPDATE workflow w
+                        SET recipients_acked = w.recipients_acked + a.acked
+                        FROM (
+                            SELECT workflow_id, COUNT(*) AS acked
+                            FROM unnest(%s::varchar[]) AS t(workflow_id)
+                            GROUP BY workflow_id
+                        ) a
+                        WHERE w.unique_id = a.workflow_id
+                    """, (params[0],))
+                    apply_rollup_delta(cursor, _FLUSHED_ROWS, params, sent="0", acked="COUNT(*)", failed="0")
+                    record_ack_latencies(cursor, _FLUSHED_ROWS, params)
+        return updated
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing acks: {e}")
+                self._wakeup.wait(1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushing": self._flushing,
+                "capacity": self.capacity,
+                "received": self.received,
+                "rejected": self.rejected,
+                "applied": self.applied,
+                "flushes": self.flushes,
+                "failures": self.failures,
+            }
+
+
+ack_buffer = AckBuffer()
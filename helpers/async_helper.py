@@ -0,0 +1,13 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import BLOCKING_IO_WORKERS
+
+# Dedicated, bounded pool for blocking psycopg2 / LDAP / Pub/Sub calls made from async routes,
+# so a slow call occupies a worker thread instead of the event loop.
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+#run a blocking callable off the event loop
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,176 @@
+import threading
+import time
+from fastapi import HTTPException
+from config import AUDIENCE_REBUILD_INTERVAL, AUDIENCE_REFRESH_INTERVAL
+from helpers.notification_helper import get_db_connection
+
+# Device attributes that audience expressions can filter on
+AUDIENCE_FIELDS = ("division", "os_type", "device_type")
+
+_DEVICE_QUERY = """
+    SELECT d.device_id, d.os_type, d.device_type, d.updated_at,
+           COALESCE(array_agg(dd.division_id) FILTER (WHERE dd.division_id IS NOT NULL), '{{}}')
+    FROM devices d
+    LEFT JOIN division_devices dd ON dd.device_id = d.device_id
+    {where}
+    GROUP BY d.device_id
+"""
+
+
+#number of set bits in a bitmap (int.bit_count needs Python 3.10)
+def _popcount(bitmap):
+    return bin(bitmap).count("1")
+
+#positions of the set bits of a bitmap, in ascending order
+def _bit_positions(bitmap):
+    positions = []
+    for offset, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")):
+        while byte:
+            low = byte & -byte
+            positions.append(offset * 8 + low.bit_length() - 1)
+            byte ^= low
+    return positions
+
+
+class AudienceIndex:
+    """In-memory bitmap index over device attributes and division membership.
+
+    Every device gets a fixed bit position, and each (field, value) pair has a bitmap
+    of the devices that match it (Python ints, so AND/OR/NOT run word-at-a-time in C).
+    An audience expression is evaluated by combining bitmaps, without touching
+    Postgres.
+
+    The index refreshes itself on use: every AUDIENCE_REFRESH_INTERVAL seconds it
+    re-reads only the devices whose updated_at moved, and every
+    AUDIENCE_REBUILD_INTERVAL seconds it rebuilds from scratch, which also drops
+    deleted devices. Until then resolve() can return deleted device ids, so the
+    fan-out paths only insert ids that are still in devices.
+
+    Expressions are JSON objects:
+        {"field": "division", "in": ["A", "B"]}    {"field": "os_type", "eq": "Windows"}
+        {"and": [...]}    {"or": [...]}    {"not": {...}}    {"all": true}
+    """
+
+    def __init__(self, refresh_interval=AUDIENCE_REFRESH_INTERVAL, rebuild_interval=AUDIENCE_REBUILD_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._positions = {}  # device_id -> bit
+        self._device_ids = []  # bit -> device_id
+        self._keys = {}  # device_id -> (field, value) keys currently set for it
+        self._bitmaps = {}  # (field, value) -> bitmap
+        self._all = 0
+        self._watermark = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def _apply(self, device_id, os_type, device_type, division_ids):
+        bit = self._positions.get(device_id)
+        if bit is None:
+            bit = len(self._device_ids)
+            self._positions[device_id] = bit
+            self._device_ids.append(device_id)
+        mask = 1 << bit
+
+        for key in self._keys.get(device_id, ()):
+            self._bitmaps[key] &= ~mask
+
+        keys = {("os_type", os_type), ("device_type", device_type)}
+        keys.update(("division", division_id) for division_id in division_ids)
+        for key in keys:
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | mask
+        self._keys[device_id] = keys
+        self._all |= mask
+
+    def _load(self, where="", params=()):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(_DEVICE_QUERY.format(where=where), params)
+                rows = cursor.fetchall()
+        for device_id, os_type, device_type, updated_at, division_ids in rows:
+            self._apply(device_id, os_type, device_type, division_ids)
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+        return len(rows)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if now - self._rebuilt_at >= self.rebuild_interval:
+            self._reset()
+            self._load()
+            self._rebuilt_at = self._refreshed_at = now
+        elif now - self._refreshed_at >= self.refresh_interval:
+            if self._watermark is None:
+                self._load()
+            else:
+                # Overlap the watermark so rows from transactions that committed late are not missed
+                self._load("WHERE d.updated_at >= %s - INTERVAL '1 minute'", (self._watermark,))
+            self._refreshed_at = now
+
+    def invalidate(self):
+        """Force a re-read of changed devices on the next lookup."""
+        with self._lock:
+            self._refreshed_at = 0.0
+
+    def _evaluate(self, expression):
+        if not isinstance(expression, dict):
+            raise HTTPException(status_code=400, detail="Audience expressions must be objects")
+
+        if "and" in expression:
+            bitmap = self._all
+            for term in expression["and"]:
+                bitmap &= self._evaluate(term)
+            return bitmap
+        if "or" in expression:
+            bitmap = 0
+            for term in expression["or"]:
+                bitmap |= self._evaluate(term)
+            return bitmap
+        if "not" in expression:
+            return self._all & ~self._evaluate(expression["not"])
+        if expression.get("all") is True:
+            return self._all
+
+        field = expression.get("field")
+        if field not in AUDIENCE_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Audience field must be one of {', '.join(AUDIENCE_FIELDS)}")
+        if "eq" in expression:
+            values = [expression["eq"]]
+        elif isinstance(expression.get("in"), list):
+            values = expression["in"]
+        else:
+            raise HTTPException(status_code=400, detail="Audience field terms need 'eq' or an 'in' list")
+
+        bitmap = 0
+        for value in values:
+            bitmap |= self._bitmaps.get((field, value), 0)
+        return bitmap
+
+    def count(self, expression):
+        with self._lock:
+            self._ensure_fresh()
+            return _popcount(self._evaluate(expression))
+
+    def resolve(self, expression):
+        """Return the device ids matched by an audience expression."""
+        with self._lock:
+            self._ensure_fresh()
+            return [self._device_ids[bit] for bit in _bit_positions(self._evaluate(expression))]
+
+    def stats(self):
+        with self._lock:
+            return {"devices": _popcount(self._all), "bitmaps": len(self._bitmaps)}
+
+
+audience_index = AudienceIndex()
+
+#resolve an "Audience" workflow's expression into its device ids
+def resolve_audience_target(workflow):
+    if workflow.NotificationType != "Audience":
+        return
+    if not workflow.audience:
+        raise HTTPException(status_code=400, detail="'audience' must be provided for 'Audience' workflows.")
+    workflow.ids = audience_index.resolve(workflow.audience)
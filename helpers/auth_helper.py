@@ -1,18 +1,28 @@
 from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
 import ldap3
-from config import LDAP_BASE_DN, LDAP_BIND_DN, LDAP_BIND_PASSWORD, LDAP_PORT, LDAP_SERVER, LDAP_USER_DN
+from ldap3.core.exceptions import LDAPBindError
+from config import AUTH_TOKEN_CACHE_SIZE, LDAP_BASE_DN, LDAP_BIND_DN, LDAP_BIND_PASSWORD, LDAP_BIND_POOL_MAX_IDLE, LDAP_BIND_POOL_MAX_SIZE, LDAP_POOL_HEALTH_CHECK_AFTER, LDAP_POOL_MAX_SIZE, LDAP_POOL_TIMEOUT, LDAP_PORT, LDAP_SERVER, LDAP_USER_DN
 from fastapi import HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from constants import TokenParams
-import bcrypt
+from helpers.cache_helper import TTLCache
+from helpers.credential_helper import check_password
 from helpers.exceptions import CREDENTIAL_EXCEPTION
+from helpers.ldap_pool import LdapConnectionPool
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token claims keyed by the token's SHA-256 digest; each entry expires at the
+# token's own exp, so a cached token is never accepted past its expiry.
+token_cache = TTLCache(ttl=TokenParams.ACCESS_TOKEN_EXPIRE_HOURS * 3600, maxsize=AUTH_TOKEN_CACHE_SIZE)
+
 #password verification
 def verify_password(plain_password, hashed_password):
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
+    return check_password(plain_password, hashed_password)
 
 #access token creation
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -41,64 +51,116 @@ def extract_token_from_cookies(request: Request) -> str:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing in cookies")
     return token
 
-#jwt verification
-def verify_jwt(token: str) -> bool:
-    isTokenValid: bool = False
+#jwt verification, cached until the token expires
+def decode_token_cached(token: str) -> dict:
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, TokenParams.SECRETE_KEY, algorithms=[TokenParams.ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
-    except JWTError:
+    if not payload:
         raise CREDENTIAL_EXCEPTION
-    if payload:
-        isTokenValid = True
-    return isTokenValid
 
-#ldap connection
+    remaining = payload["exp"] - time.time() if "exp" in payload else None
+    if remaining is None or remaining > 0:
+        token_cache.set(key, payload, ttl=remaining)
+    return payload
+
+def verify_jwt(token: str) -> bool:
+    decode_token_cached(token)
+    return True
+
+#auth dependency: verify the cookie token once per request and keep its claims on request.state
+def get_current_user(request: Request) -> dict:
+    principal = getattr(request.state, "principal", None)
+    if principal is None:
+        principal = decode_token_cached(extract_token_from_cookies(request))
+        request.state.principal = principal
+    return principal
+
+_ldap_pool = None
+_ldap_bind_pool = None
+_ldap_pool_lock = threading.Lock()
+
+# One Server object for every pooled connection. Nothing here uses the root DSE/schema,
+# so connections skip reading it on connect.
+_ldap_server = ldap3.Server(LDAP_SERVER, port=LDAP_PORT, get_info=ldap3.NONE)
+
+#shared LDAP pools, created on first use: bound service connections and unbound
+#connections for end-user credential binds
+def get_ldap_pool():
+    global _ldap_pool, _ldap_bind_pool
+    if _ldap_pool is None:
+        with _ldap_pool_lock:
+            if _ldap_pool is None:
+                _ldap_bind_pool = LdapConnectionPool(
+                    _ldap_server,
+                    max_size=LDAP_BIND_POOL_MAX_SIZE,
+                    timeout=LDAP_POOL_TIMEOUT,
+                    health_check_after=LDAP_POOL_HEALTH_CHECK_AFTER,
+                    max_idle=LDAP_BIND_POOL_MAX_IDLE,
+                )
+                _ldap_pool = LdapConnectionPool(
+                    _ldap_server,
+                    user=LDAP_BIND_DN,
+                    password=LDAP_BIND_PASSWORD,
+                    max_size=LDAP_POOL_MAX_SIZE,
+                    timeout=LDAP_POOL_TIMEOUT,
+                    health_check_after=LDAP_POOL_HEALTH_CHECK_AFTER,
+                )
+    return _ldap_pool
+
+def get_ldap_bind_pool():
+    get_ldap_pool()
+    return _ldap_bind_pool
+
+def get_ldap_pool_stats():
+    return {"service": get_ldap_pool().stats(), "user_bind": get_ldap_bind_pool().stats()}
+
+#ldap connection: borrow a bound service connection, `with connect_to_ldap() as connection:`
 def connect_to_ldap():
     try:
-        server = ldap3.Server(LDAP_SERVER, port=LDAP_PORT, get_info=ldap3.ALL)
-        connection = ldap3.Connection(server, user=LDAP_BIND_DN, password=LDAP_BIND_PASSWORD)
-        if not connection.bind():
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to bind to the LDAP server: {connection.last_error}")
-        return connection
+        return get_ldap_pool().connection()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error connecting to LDAP: {e}")
 
 #ldap authentication
 def authenticate_user_ldap(username: str, password: str) -> bool:
     try:
-        connection = connect_to_ldap()
-        if connection is None:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No connection to LDAP server.")
-
         user_dn = f"uid={username},{LDAP_USER_DN},{LDAP_BASE_DN}"
-        user_connection = ldap3.Connection(connection.server, user=user_dn, password=password)
-        if user_connection.bind():
-            user_connection.unbind()
-            return True
-        else:
-            user_connection.unbind()
+        try:
+            # A failed bind raises, so the pool discards that connection
+            with get_ldap_bind_pool().connection() as user_connection:
+                if not user_connection.rebind(user=user_dn, password=password):
+                    raise LDAPBindError(user_connection.last_error)
+        except LDAPBindError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password")
+        return True
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error during authentication: {e}")
 
 #authenticate username
 def authenticate_username(username: str) -> bool:
     try:
-        connection = connect_to_ldap()
-        if connection is None:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No connection to LDAP server.")
-
-        search_filter = f"(uid={username})"
-        connection.search(
-            search_base=f"{LDAP_USER_DN},{LDAP_BASE_DN}",
-            search_filter=search_filter,
-            attributes=["uid"]
-        )
-
-        if connection.entries:
+        with connect_to_ldap() as connection:
+            search_filter = f"(uid={username})"
+            connection.search(
+                search_base=f"{LDAP_USER_DN},{LDAP_BASE_DN}",
+                search_filter=search_filter,
+                attributes=["uid"]
+            )
+            found = bool(connection.entries)
+
+        if found:
             return True
         else:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Username not found")
@@ -108,31 +170,26 @@ def authenticate_username(username: str) -> bool:
 #user creation
 def create_user(username: str, password: str) -> bool:
     try:
-        connection = connect_to_ldap()
-        if connection is None:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No connection to LDAP server.")
-
-        base_dn = LDAP_BASE_DN
-        ou_dn = f"ou=users,{base_dn}"
-
-        user_dn = f"uid={username},{ou_dn}"
-        if connection.search(ou_dn, f"(uid={username})", search_scope=ldap3.SUBTREE):
-            connection.unbind()
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")  
-
-        attributes = {
-            "objectClass": ["top", "person", "organizationalPerson", "inetOrgPerson"],
-            "uid": username,
-            "cn": username,
-            "sn": "user",
-            "userPassword": password,
-            "mail": f"{username}@cybotronics.com",
-        }
-
-        if connection.add(user_dn, attributes=attributes):
-            connection.unbind()
-            return True
-        else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create user: {connection.last_error}")
+        with connect_to_ldap() as connection:
+            base_dn = LDAP_BASE_DN
+            ou_dn = f"ou=users,{base_dn}"
+
+            user_dn = f"uid={username},{ou_dn}"
+            if connection.search(ou_dn, f"(uid={username})", search_scope=ldap3.SUBTREE):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")  
+
+            attributes = {
+                "objectClass": ["top", "person", "organizationalPerson", "inetOrgPerson"],
+                "uid": username,
+                "cn": username,
+                "sn": "user",
+                "userPassword": password,
+                "mail": f"{username}@cybotronics.com",
+            }
+
+            if connection.add(user_dn, attributes=attributes):
+                return True
+            else:
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create user: {connection.last_error}")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error during user creation: {e}")
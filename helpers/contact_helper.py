@@ -1,134 +1,132 @@
-from typing import List
+from typing import List, Optional
 import ldap3
+from fastapi import HTTPException
 from config import LDAP_BASE_DN
 from helpers.auth_helper import connect_to_ldap
+from helpers.contact_mirror import contact_mirror
+from helpers.cursor_helper import encode_cursor
+from helpers.device_registry import device_registry
 from models.contacts import Contact
 
 #contact creation
 def create_contact(username: str, email: str, division: str) -> bool:
     try:
-        connection = connect_to_ldap()
-        if connection is None:
-            print("No connection to LDAP server.")
-            return False
+        with connect_to_ldap() as connection:
+            ou_dn = f"ou=contacts,{LDAP_BASE_DN}"
+            
+            if not connection.search(ou_dn, "(objectClass=*)", search_scope=ldap3.BASE):
+                ou_attributes = {
+                    "objectClass": ["top", "organizationalUnit"],
+                    "ou": "contacts"
+                }
+                if not connection.add(ou_dn, attributes=ou_attributes):
+                    print(f"Failed to create 'ou=contacts': {connection.last_error}")
+                    return False
 
-        ou_dn = f"ou=contacts,{LDAP_BASE_DN}"
-        
-        if not connection.search(LDAP_BASE_DN, f"(ou=contacts)", search_scope=ldap3.SUBTREE):
-            ou_attributes = {
-                "objectClass": ["top", "organizationalUnit"],
-                "ou": "contacts"
+            contact_dn = f"cn={username},{ou_dn}"
+            
+            attributes = {
+                "objectClass": ["top", "inetOrgPerson"],
+                "cn": username,
+                "sn": username,  
+                "mail": email,
+                "ou": division,  
             }
-            if not connection.add(ou_dn, attributes=ou_attributes):
-                print(f"Failed to create 'ou=contacts': {connection.last_error}")
-                connection.unbind()
-                return False
-
-        contact_dn = f"cn={username},{ou_dn}"
-        
-        attributes = {
-            "objectClass": ["top", "inetOrgPerson"],
-            "cn": username,
-            "sn": username,  
-            "mail": email,
-            "ou": division,  
-        }
 
-        if connection.add(contact_dn, attributes=attributes):
-            print(f"Contact {username} created successfully.")
-            connection.unbind()
-            return True
-        else:
-            print(f"Failed to create contact {username}: {connection.last_error}")
-            connection.unbind()
-            return False
+            if connection.add(contact_dn, attributes=attributes):
+                contact_mirror.upsert(contact_dn, attributes)
+                print(f"Contact {username} created successfully.")
+                return True
+            else:
+                print(f"Failed to create contact {username}: {connection.last_error}")
+                return False
     except Exception as e:
         print(f"Error during contact creation: {e}")
         return False
     
-# fetch all contacts
-def get_all_contacts() -> List[Contact]:
-    try:
-        connection = connect_to_ldap()
-        if connection is None:
-            print("No connection to LDAP server.")
-            return []
-
-        ou_dn = f"ou=contacts,{LDAP_BASE_DN}"
-        
-        search_filter = "(objectClass=inetOrgPerson)"
-        attributes = ['cn', 'mail', 'ou', 'employeeNumber']
-        
-        if not connection.search(
-            ou_dn,
-            search_filter,
-            attributes=attributes,
-            search_scope=ldap3.SUBTREE
-        ):
-            print("No contacts found or search failed")
-            connection.unbind()
-            return []
+#build Contact models from mirror entries, skipping malformed ones
+def _to_contacts(entries) -> List[Contact]:
+    contacts = []
+    for entry in entries:
+        try:
+            contact = Contact(
+                username=entry["username"],
+                email=entry["email"],
+                Division=str(entry["Division"]),
+                device_id=entry["device_id"]
+            )
+            contacts.append(contact)
+        except Exception as e:
+            print(f"Error processing contact entry: {e}")
+            continue
+    return contacts
 
-        contacts = []
-        for entry in connection.entries:
-            try:
-                device_id = str(entry.employeeNumber) if hasattr(entry, 'employeeNumber') else None
-                
-                contact = Contact(
-                    username=str(entry.cn),
-                    email=str(entry.mail),
-                    Division=str(entry.ou),
-                    device_id=device_id
-                )
-                contacts.append(contact)
-            except Exception as e:
-                print(f"Error processing contact entry: {e}")
-                continue
-
-        connection.unbind()
-        return contacts
-
-    except Exception as e:
-        print(f"Error fetching contacts: {e}")
-        return []
-    
 #update contact
 def update_contact_device_id_by_email(email: str, device_id: str) -> bool:
     try:
-        connection = connect_to_ldap()
-        if connection is None:
-            print("No connection to LDAP server.")
+        contact = contact_mirror.get_by_email(email)
+        if contact is None:
+            print(f"Contact with email {email} not found.")
             return False
 
-        search_filter = f"(mail={email})"
-        print(f"Searching LDAP with filter: {search_filter}")
-        
-        if not connection.search(LDAP_BASE_DN, search_filter, search_scope=ldap3.SUBTREE):
-            print(f"Contact with email {email} not found. Last error: {connection.last_error}")
-            connection.unbind()
-            return False
-
-        if len(connection.entries) == 0:
-            print(f"No entries returned for email {email}. Check if the email format matches.")
-            connection.unbind()
-            return False
-
-        contact_dn = connection.entries[0].entry_dn
-        print(f"Found contact DN: {contact_dn}")
-
+        contact_dn = contact["dn"]
         changes = {
             'employeeNumber': [(ldap3.MODIFY_REPLACE, [device_id])]
         }
 
-        if connection.modify(contact_dn, changes):
-            print(f"Device ID updated successfully for {email}")
-            connection.unbind()
-            return True
-        else:
-            print(f"Failed to update device ID for {email}: {connection.last_error}")
-            connection.unbind()
-            return False
+        with connect_to_ldap() as connection:
+            if not connection.modify(contact_dn, changes):
+                print(f"Failed to update device ID for {email}: {connection.last_error}")
+                return False
+
+        contact_mirror.upsert(contact_dn, {
+            "cn": contact["username"],
+            "mail": contact["email"],
+            "ou": contact["Division"],
+            "employeeNumber": device_id,
+        })
+        print(f"Device ID updated successfully for {email}")
+        return True
 
     except Exception as e:
         print(f"Error updating device ID by email: {e}")
-        return False
\ No newline at end of file
+        return False
+
+#delete contact
+def delete_contact_by_username(username: str) -> bool:
+    contact = contact_mirror.get_by_cn(username)
+    if contact is None:
+        raise HTTPException(status_code=404, detail=f"Contact {username} not found.")
+
+    with connect_to_ldap() as connection:
+        if not connection.delete(contact["dn"]):
+            return False
+
+    contact_mirror.remove(contact["dn"])
+    print(f"Contact {username} deleted successfully.")
+    return True
+
+#look up a contact dn by email
+def find_contact_dn_by_email(email: str) -> str:
+    contact = contact_mirror.get_by_email(email)
+    if contact is None:
+        raise HTTPException(status_code=404, detail=f"Contact with email {email} not found.")
+    return contact["dn"]
+
+#resolve device types for a batch of contacts with one registry lookup
+def _attach_device_types(contacts: List[Contact]) -> List[Contact]:
+    devices = device_registry.get_many(contact.device_id for contact in contacts if contact.device_id)
+    for contact in contacts:
+        device = devices.get(contact.device_id)
+        contact.device_type = device["device_type"] if device else "Unknown"
+    return contacts
+
+#contacts whose employeeNumber is the given device id, with their device types
+def get_contacts_by_device_id(device_id: str) -> List[Contact]:
+    return _attach_device_types(_to_contacts(contact_mirror.get_by_device_id(device_id)))
+
+#fetch one page of contacts ordered by username, with their device types
+def get_contacts_page(limit: int, after: Optional[str] = None, division: Optional[str] = None):
+    entries, total = contact_mirror.page(limit, after=after, division=division)
+    next_cursor = encode_cursor(entries[-1]["username"]) if len(entries) == limit else None
+    return _attach_device_types(_to_contacts(entries)), total, next_cursor
@@ -0,0 +1,262 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import ldap3
+from config import CONTACT_LDAP_PAGE_SIZE, CONTACT_MIRROR_REBUILD_INTERVAL, CONTACT_MIRROR_REFRESH_INTERVAL, LDAP_BASE_DN
+from helpers.auth_helper import connect_to_ldap
+from helpers.notification_helper import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CONTACTS_DN = f"ou=contacts,{LDAP_BASE_DN}"
+CONTACT_ATTRIBUTES = ["cn", "mail", "ou", "employeeNumber", "modifyTimestamp"]
+
+# A lookup miss forces an incremental refresh, at most this often, so a contact added
+# by another process is found without waiting for the refresh interval.
+_MISS_REFRESH_AFTER = 1.0
+
+
+#first value of an attribute from an LDAP search response
+def _first(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+#modifyTimestamp comes back as a datetime when the schema is known, otherwise as GeneralizedTime text
+def _timestamp(value):
+    value = _first(value)
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.strptime(str(value)[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+#contacts are listed by username, case-insensitively
+def _sort_key(username):
+    return username.lower(), username
+
+
+class ContactMirror:
+    """In-memory copy of the contacts OU, indexed by cn, mail and employeeNumber.
+
+    Reads never search the directory by mail or cn: every
+    CONTACT_MIRROR_REFRESH_INTERVAL seconds the mirror re-reads only the entries whose
+    modifyTimestamp moved, and every CONTACT_MIRROR_REBUILD_INTERVAL seconds it
+    reloads the OU. Writers go to LDAP first and then apply the change here with
+    upsert()/remove().
+
+    A deletion leaves no modifyTimestamp to find, so remove() also records the dn in
+    contact_deletions. Each refresh reads the deletions recorded since the last one
+    and re-checks those entries in LDAP, so contacts deleted by another process drop
+    out within one refresh interval.
+    """
+
+    def __init__(self, refresh_interval=CONTACT_MIRROR_REFRESH_INTERVAL, rebuild_interval=CONTACT_MIRROR_REBUILD_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.RLock()
+        self._reset()
+        self._rebuilds = 0
+        self._refreshes = 0
+
+    def _reset(self):
+        self._by_dn = {}  # dn -> contact
+        self._by_cn = {}
+        self._by_mail = {}  # lower-cased mail -> contact
+        self._by_device_id = {}  # employeeNumber -> [contacts]
+        self._ordered = None  # contacts sorted by username, rebuilt after changes
+        self._ordered_keys = None  # _sort_key of each entry in _ordered, for bisecting
+        self._watermark = None
+        self._deletions_since = None  # database time of the last contact_deletions read
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def _unindex(self, contact):
+        self._ordered = None
+        self._by_cn.pop(contact["username"], None)
+        if contact["email"]:
+            self._by_mail.pop(contact["email"].lower(), None)
+        if contact["device_id"]:
+            contacts = [c for c in self._by_device_id.get(contact["device_id"], []) if c["dn"] != contact["dn"]]
+            if contacts:
+                self._by_device_id[contact["device_id"]] = contacts
+            else:
+                self._by_device_id.pop(contact["device_id"], None)
+
+    def _index(self, contact):
+        previous = self._by_dn.get(contact["dn"])
+        if previous is not None:
+            self._unindex(previous)
+        self._by_dn[contact["dn"]] = contact
+        self._ordered = None
+        self._by_cn[contact["username"]] = contact
+        if contact["email"]:
+            self._by_mail[contact["email"].lower()] = contact
+        if contact["device_id"]:
+            self._by_device_id.setdefault(contact["device_id"], []).append(contact)
+
+    def _apply(self, dn, attributes):
+        device_id = _first(attributes.get("employeeNumber"))
+        self._index({
+            "dn": dn,
+            "username": str(_first(attributes.get("cn"))),
+            "email": _first(attributes.get("mail")),
+            "Division": _first(attributes.get("ou")),
+            "device_id": str(device_id) if device_id is not None else None,
+        })
+        modified = _timestamp(attributes.get("modifyTimestamp"))
+        if modified is not None and (self._watermark is None or modified > self._watermark):
+            self._watermark = modified
+
+    # Simple paged results (RFC 2696): entries are applied page by page as they
+    # stream in, so neither side has to hold the whole OU in one response.
+    def _load(self, search_filter):
+        loaded = 0
+        with connect_to_ldap() as connection:
+            entries = connection.extend.standard.paged_search(
+                CONTACTS_DN,
+                search_filter,
+                search_scope=ldap3.SUBTREE,
+                attributes=CONTACT_ATTRIBUTES,
+                paged_size=CONTACT_LDAP_PAGE_SIZE,
+                generator=True,
+            )
+            for entry in entries:
+                if entry.get("type") == "searchResEntry":
+                    self._apply(entry["dn"], entry["attributes"])
+                    loaded += 1
+        return loaded
+
+    #dns recorded in contact_deletions since the last read (overlapping it by a minute)
+    def _read_deletions(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                if self._deletions_since is None:
+                    cursor.execute("SELECT now()")
+                    self._deletions_since = cursor.fetchone()[0]
+                    return []
+                cursor.execute("""
+                    SELECT now(), ARRAY(
+                        SELECT DISTINCT dn FROM contact_deletions WHERE deleted_at >= %s - INTERVAL '1 minute'
+                    )
+                """, (self._deletions_since,))
+                self._deletions_since, dns = cursor.fetchone()
+        return dns
+
+    # The dn may have been created again since it was deleted, so LDAP decides.
+    def _recheck(self, dns):
+        with connect_to_ldap() as connection:
+            for dn in dns:
+                if connection.search(dn, "(objectClass=inetOrgPerson)", search_scope=ldap3.BASE, attributes=CONTACT_ATTRIBUTES):
+                    self._apply(dn, connection.response[0]["attributes"])
+                else:
+                    contact = self._by_dn.pop(dn, None)
+                    if contact is not None:
+                        self._unindex(contact)
+
+    def _refresh(self):
+        if self._watermark is None:
+            self._load("(objectClass=inetOrgPerson)")
+        else:
+            # Overlap the watermark: modifyTimestamp has one-second resolution and replicas can lag
+            since = (self._watermark - timedelta(minutes=1)).strftime("%Y%m%d%H%M%SZ")
+            self._load(f"(&(objectClass=inetOrgPerson)(modifyTimestamp>={since}))")
+        deleted = [dn for dn in self._read_deletions() if dn in self._by_dn]
+        if deleted:
+            self._recheck(deleted)
+        self._refreshed_at = time.monotonic()
+        self._refreshes += 1
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if now - self._rebuilt_at >= self.rebuild_interval:
+            self._reset()
+            self._read_deletions()  # start the deletion watermark before the full load
+            self._load("(objectClass=inetOrgPerson)")
+            self._rebuilt_at = self._refreshed_at = now
+            self._rebuilds += 1
+            logger.info(f"Contact mirror loaded {len(self._by_dn)} contacts")
+        elif now - self._refreshed_at >= self.refresh_interval:
+            self._refresh()
+
+    def _lookup(self, index, key):
+        with self._lock:
+            self._ensure_fresh()
+            found = index().get(key)
+            if found is None and time.monotonic() - self._refreshed_at >= _MISS_REFRESH_AFTER:
+                self._refresh()
+                found = index().get(key)
+            return found
+
+    def _sorted(self):
+        self._ensure_fresh()
+        if self._ordered is None:
+            self._ordered = sorted(self._by_dn.values(), key=lambda contact: _sort_key(contact["username"]))
+            self._ordered_keys = [_sort_key(contact["username"]) for contact in self._ordered]
+        return self._ordered, self._ordered_keys
+
+    def page(self, limit, after=None, division=None):
+        """Return (contacts, total) for one page ordered by username.
+
+        after is the username of the last contact on the previous page; total counts
+        every contact matching the division filter.
+        """
+        with self._lock:
+            ordered, keys = self._sorted()
+        if division is not None:
+            matching = [i for i, contact in enumerate(ordered) if contact["Division"] == division]
+            ordered = [ordered[i] for i in matching]
+            keys = [keys[i] for i in matching]
+        start = bisect.bisect_right(keys, _sort_key(after)) if after is not None else 0
+        return ordered[start:start + limit], len(ordered)
+
+    def get_by_email(self, email):
+        return self._lookup(lambda: self._by_mail, email.lower())
+
+    def get_by_cn(self, username):
+        return self._lookup(lambda: self._by_cn, username)
+
+    def get_by_device_id(self, device_id):
+        return list(self._lookup(lambda: self._by_device_id, device_id) or [])
+
+    def upsert(self, dn, attributes):
+        """Record an entry that was just written to LDAP."""
+        with self._lock:
+            self._apply(dn, attributes)
+
+    def remove(self, dn):
+        """Record an entry that was just deleted from LDAP, here and for other processes."""
+        with self._lock:
+            contact = self._by_dn.pop(dn, None)
+            if contact is not None:
+                self._unindex(contact)
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("INSERT INTO contact_deletions (dn) VALUES (%s)", (dn,))
+                    # Older deletions are covered by every process's periodic rebuild
+                    cursor.execute(
+                        "DELETE FROM contact_deletions WHERE deleted_at < now() - make_interval(secs => %s)",
+                        (2 * self.rebuild_interval,)
+                    )
+        except Exception as e:
+            logger.error(f"Could not record the deletion of {dn}: {e}")
+
+    def invalidate(self):
+        """Force a full reload on the next lookup."""
+        with self._lock:
+            self._rebuilt_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "contacts": len(self._by_dn),
+                "watermark": self._watermark.isoformat() if self._watermark else None,
+                "refreshes": self._refreshes,
+                "rebuilds": self._rebuilds,
+            }
+
+
+contact_mirror = ContactMirror()
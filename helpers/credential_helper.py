@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from config import BCRYPT_MAX_QUEUE, BCRYPT_WORKERS, CREDENTIAL_IO_MAX_QUEUE, CREDENTIAL_IO_WORKERS
+
+
+class CredentialExecutor:
+    """Bounded executor for credential work (LDAP binds, bcrypt).
+
+    At most `workers` jobs run at once and at most `max_queue` more wait for a
+    slot. Past that, submissions are rejected straight away with a 503, so a login
+    burst sheds load instead of queueing without limit and starving the rest of
+    the API. The underlying executor is created on first use; bcrypt runs in a
+    process pool so hashing does not hold the GIL of the API process.
+    """
+
+    def __init__(self, name, workers, max_queue, processes=False):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._peak_queue = 0
+        self._busy_seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self._processes:
+                    # Spawn, not fork: the API process holds gRPC channels, pooled DB
+                    # connections and worker threads that a forked child must not inherit.
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def _done(self, started, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._busy_seconds += time.monotonic() - started
+            if future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def submit_many(self, func, args_list):
+        """Submit one job per args tuple, reserving capacity for all of them up front.
+
+        Either every job is queued or none is, so a rejected batch never leaves
+        earlier jobs running and holding slots.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._in_flight + len(args_list) > self.workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(status_code=503, detail="The server is busy. Please try again shortly.")
+            self._in_flight += len(args_list)
+            self._submitted += len(args_list)
+            self._peak_queue = max(self._peak_queue, self._in_flight - self.workers)
+
+        futures = []
+        for i, args in enumerate(args_list):
+            started = time.monotonic()
+            try:
+                future = executor.submit(func, *args)
+            except Exception:
+                with self._lock:
+                    self._in_flight -= len(args_list) - i
+                for future in futures:
+                    future.cancel()
+                raise
+            future.add_done_callback(lambda f, started=started: self._done(started, f))
+            futures.append(future)
+        return futures
+
+    def submit(self, func, *args):
+        return self.submit_many(func, [args])[0]
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def run_sync(self, func, *args):
+        return self.submit(func, *args).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": min(self._in_flight, self.workers),
+                "queued": max(self._in_flight - self.workers, 0),
+                "peak_queued": self._peak_queue,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "busy_seconds": round(self._busy_seconds, 3),
+            }
+
+
+credential_executor = CredentialExecutor("credential-io", CREDENTIAL_IO_WORKERS, CREDENTIAL_IO_MAX_QUEUE)
+bcrypt_executor = CredentialExecutor("bcrypt", BCRYPT_WORKERS, BCRYPT_MAX_QUEUE, processes=True)
+
+# Module-level so the process pool can pickle them
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8") if isinstance(hashed, str) else hashed)
+
+def _hashpw(password):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+#check a password against a bcrypt hash in the bcrypt process pool
+def check_password(password, hashed):
+    return bcrypt_executor.run_sync(_checkpw, password, hashed)
+
+#check a password against several hashes in parallel; True if any of them matches
+def matches_any_password(password, hashes):
+    futures = bcrypt_executor.submit_many(_checkpw, [(password, hashed) for hashed in hashes])
+    return any([future.result() for future in futures])
+
+#hash a password in the bcrypt process pool
+def hash_password(password):
+    return bcrypt_executor.run_sync(_hashpw, password)
+
+def get_credential_stats():
+    return {"credential_io": credential_executor.stats(), "bcrypt": bcrypt_executor.stats()}
@@ -0,0 +1,18 @@
+import base64
+from fastapi import HTTPException
+
+#opaque keyset cursor: the sort key of the last row on a page, "|"-joined and base64 encoded
+def encode_cursor(*parts):
+    return base64.urlsafe_b64encode("|".join(str(part) for part in parts).encode("utf-8")).decode("ascii")
+
+#decode a cursor into its parts, converting each with the matching parser; one part comes back bare
+def decode_cursor(value, *parsers):
+    parsers = parsers or (str,)
+    try:
+        parts = base64.urlsafe_b64decode(value.encode("ascii")).decode("utf-8").split("|", len(parsers) - 1)
+        if len(parts) != len(parsers):
+            raise ValueError("Wrong number of cursor parts")
+        decoded = [parse(part) for parse, part in zip(parsers, parts)]
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return decoded[0] if len(decoded) == 1 else tuple(decoded)
@@ -0,0 +1,118 @@
+from config import DASHBOARD_CACHE_TTL
+from helpers.cache_helper import TTLCache
+from helpers.notification_helper import get_db_connection
+from helpers.sketch_helper import LatencySketch
+
+dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL, maxsize=64)
+
+# Sections are read from the daily delivery rollup (see helpers/rollup_helper.py), using
+# half-open ranges on its bucket so the predicates stay index-friendly.
+SECTION_FILTERS = {
+    "all_time": "TRUE",
+    "daily": "r.bucket >= CURRENT_DATE",
+    "weekly": "r.bucket >= DATE_TRUNC('week', CURRENT_DATE) AND r.bucket < DATE_TRUNC('week', CURRENT_DATE) + INTERVAL '1 week'",
+    "monthly": "r.bucket >= DATE_TRUNC('month', CURRENT_DATE) AND r.bucket < DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month'",
+    "scheduled": "r.workflow_type = 'scheduled'",
+}
+
+BREAKDOWN_COLUMNS = ("device_type", "division")
+
+#drop cached dashboard figures after workflows are created or acknowledged
+def invalidate_dashboard_cache():
+    dashboard_cache.invalidate()
+
+#count delivery rows for every dashboard section in one pass
+def compute_summary_counts():
+    columns = ",\n".join(f"COALESCE(SUM(r.sent) FILTER (WHERE {condition}), 0) AS {section}" for section, condition in SECTION_FILTERS.items())
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {columns}
+                FROM delivery_rollup_daily r;
+            """)
+            row = cursor.fetchone()
+    return dict(zip(SECTION_FILTERS, (int(value) for value in row)))
+
+#total and unacknowledged deliveries for one dashboard section in one pass
+def compute_section_counts(section, condition=None):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(r.sent), 0), COALESCE(SUM(r.sent - r.acked), 0)
+                FROM delivery_rollup_daily r
+                WHERE {condition or SECTION_FILTERS[section]};
+            """)
+            total, failed = cursor.fetchone()
+    return int(total), int(failed)
+
+#total and unacknowledged deliveries grouped by a device attribute
+def compute_breakdown(filter_by):
+    if filter_by not in BREAKDOWN_COLUMNS:
+        raise ValueError(f"Invalid breakdown column: {filter_by}")
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT NULLIF(r.{filter_by}, ''), SUM(r.sent), SUM(r.sent - r.acked)
+                FROM delivery_rollup_daily r
+                GROUP BY r.{filter_by}
+                HAVING SUM(r.sent) > 0;
+            """)
+            return [(value, int(total), int(failed)) for value, total, failed in cursor.fetchall()]
+
+LATENCY_GROUPS = {
+    "hour": "s.bucket",
+    "day": "date_trunc('day', s.bucket)",
+    "priority": "s.priority",
+    "division": "s.division",
+}
+
+#ack latency percentiles, merged from the stored per-bucket sketches instead of scanning raw rows
+def compute_ack_latency(group_by=None, time_from=None, time_to=None, priority=None, division=None):
+    conditions, params = ["TRUE"], []
+    if time_from is not None:
+        conditions.append("s.bucket >= date_trunc('hour', %s::timestamptz)")
+        params.append(time_from)
+    if time_to is not None:
+        conditions.append("s.bucket < %s")
+        params.append(time_to)
+    if priority is not None:
+        conditions.append("s.priority = %s")
+        params.append(priority)
+    if division is not None:
+        conditions.append("s.division = %s")
+        params.append(division)
+    group_expr = LATENCY_GROUPS[group_by] if group_by else "NULL"
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {group_expr} AS grp, s.bin, SUM(s.count)
+                FROM ack_latency_sketch_bins s
+                WHERE {" AND ".join(conditions)}
+                GROUP BY 1, 2
+                ORDER BY 1
+            """, tuple(params))
+            rows = cursor.fetchall()
+
+    sketches = {}
+    for group, index, count in rows:
+        sketches.setdefault(group, LatencySketch()).add_bin(index, int(count))
+    if not group_by:
+        return (sketches.get(None) or LatencySketch()).summary()
+    return [{group_by: group, **sketch.summary()} for group, sketch in sketches.items()]
+
+def get_summary_counts():
+    return dashboard_cache.get_or_compute("summary", compute_summary_counts)
+
+def get_section_counts(section):
+    return dashboard_cache.get_or_compute(("section", section), lambda: compute_section_counts(section))
+
+def get_breakdown(filter_by):
+    return dashboard_cache.get_or_compute(("breakdown", filter_by), lambda: compute_breakdown(filter_by))
+
+def get_ack_latency(group_by=None, time_from=None, time_to=None, priority=None, division=None):
+    key = ("ack_latency", group_by, time_from, time_to, priority, division)
+    return dashboard_cache.get_or_compute(key, lambda: compute_ack_latency(group_by, time_from, time_to, priority, division))
+
+def get_high_priority_counts():
+    return dashboard_cache.get_or_compute("high_priority", lambda: compute_section_counts("high_priority", "r.priority = 'high'"))
@@ -0,0 +1,247 @@
+import collections
+import logging
+import threading
+import time
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# How often a borrower blocked on a full pool looks for connections reclaimed from
+# garbage-collected wrappers.
+_RECLAIM_POLL_INTERVAL = 1.0
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Thin proxy around a psycopg2 connection that returns it to its pool on close().
+
+    A wrapper that is garbage-collected without close() hands its connection back
+    to the pool through a finalizer, so a missed close() cannot leak a pool slot.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, pool._reclaim, conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        if self._finalizer.detach() is not None:
+            self._pool.release(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """Bounded, thread-safe psycopg2 connection pool with borrow-time health checks."""
+
+    def __init__(self, dsn_kwargs, min_size=1, max_size=10, timeout=10.0, health_check_after=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: expected 0 <= min_size <= max_size and max_size >= 1")
+        self._dsn_kwargs = dsn_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._lock = threading.Condition()
+        self._idle = []  # (conn, returned_at)
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._orphans = collections.deque()  # connections of wrappers collected without close()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._reclaimed = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self._dsn_kwargs)
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._discarded += 1
+
+    # Finalizer callback. It can run inside any allocation, even in a thread that holds
+    # the pool lock, so it only queues the connection; borrowers release it later.
+    def _reclaim(self, conn):
+        self._orphans.append(conn)
+
+    def _release_orphans(self):
+        while self._orphans:
+            try:
+                conn = self._orphans.popleft()
+            except IndexError:
+                break
+            logger.warning("Reclaiming a pooled database connection that was never closed")
+            with self._lock:
+                self._reclaimed += 1
+            self.release(conn)
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            self._release_orphans()
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                while not self._idle and self._size >= self.max_size and not self._orphans:
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                    self._lock.wait(min(remaining, _RECLAIM_POLL_INTERVAL))
+
+                if not self._idle and self._size >= self.max_size:
+                    continue
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    create = False
+                else:
+                    conn, returned_at = None, None
+                    self._size += 1
+                    self._in_use += 1
+                    create = True
+
+            # Connect and health check outside the lock so other borrowers are not blocked.
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(conn, time.monotonic() - returned_at):
+                logger.warning("Discarding unhealthy pooled database connection")
+                with self._lock:
+                    self._discard(conn)
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._lock.notify()
+                continue
+
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._checkouts += 1
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return PooledConnection(self, conn)
+
+    def release(self, conn):
+        reusable = not conn.closed
+        if reusable:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                reusable = False
+
+        with self._lock:
+            self._in_use -= 1
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+                self._size -= 1
+            self._lock.notify()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "reclaimed": self._reclaimed,
+                "avg_checkout_ms": round(self._checkout_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_checkout_ms": round(self._checkout_time_max * 1000, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._lock.notify_all()
+
+
+def listen_connection(dsn_kwargs, *channels):
+    """Open a dedicated autocommit connection LISTENing on the given channels.
+
+    LISTEN connections are long-lived and must not sit inside a transaction, so they
+    are opened outside the pool.
+    """
+    conn = psycopg2.connect(**dsn_kwargs)
+    conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cursor:
+        for channel in channels:
+            cursor.execute(f"LISTEN {channel};")
+    return conn
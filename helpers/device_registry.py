@@ -0,0 +1,117 @@
+from config import DEVICE_CACHE_MAXSIZE, DEVICE_CACHE_TTL
+from helpers.cache_helper import TTLCache
+from helpers.notification_helper import get_db_connection
+
+_MISSING = object()
+
+# One row per device with its division memberships folded into arrays
+_DEVICE_QUERY = """
+    SELECT d.device_id, d.device_name, d.os_type, d.device_type,
+           COALESCE(array_agg(dv.division_id) FILTER (WHERE dv.division_id IS NOT NULL), '{}'),
+           COALESCE(array_agg(dv.division_name) FILTER (WHERE dv.division_id IS NOT NULL), '{}')
+    FROM devices d
+    LEFT JOIN division_devices dd ON dd.device_id = d.device_id
+    LEFT JOIN divisions dv ON dv.division_id = dd.division_id
+    {where}
+    GROUP BY d.device_id
+"""
+
+
+class DeviceRegistry:
+    """In-process cache of device metadata.
+
+    Maps device_id to name, os_type, device_type and division memberships, plus the
+    device ids of each division and of the whole fleet. Entries expire after
+    DEVICE_CACHE_TTL seconds; writers that change devices or divisions call
+    invalidate(). Lookups take many ids at once and load every miss in one query.
+    Unknown device ids are cached too, so repeated lookups of them stay cheap.
+    """
+
+    def __init__(self, ttl=DEVICE_CACHE_TTL, maxsize=DEVICE_CACHE_MAXSIZE):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    @staticmethod
+    def _device(row):
+        device_id, device_name, os_type, device_type, division_ids, division_names = row
+        return {
+            "device_id": device_id,
+            "device_name": device_name,
+            "os_type": os_type,
+            "device_type": device_type,
+            "division_ids": list(division_ids),
+            "division_names": list(division_names),
+        }
+
+    def _load(self, where="", params=()):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(_DEVICE_QUERY.format(where=where), params)
+                devices = [self._device(row) for row in cursor.fetchall()]
+        for device in devices:
+            self._cache.set(("device", device["device_id"]), device)
+        return devices
+
+    def get_many(self, device_ids):
+        """Return {device_id: device} for the known ids among device_ids."""
+        found, missing = {}, []
+        for device_id in dict.fromkeys(device_ids):
+            device = self._cache.get(("device", device_id), _MISSING)
+            if device is _MISSING:
+                missing.append(device_id)
+            elif device is not None:
+                found[device_id] = device
+
+        if missing:
+            loaded = {device["device_id"]: device for device in self._load("WHERE d.device_id = ANY(%s)", (missing,))}
+            for device_id in missing:
+                if device_id in loaded:
+                    found[device_id] = loaded[device_id]
+                else:
+                    self._cache.set(("device", device_id), None)
+        return found
+
+    def get(self, device_id):
+        return self.get_many([device_id]).get(device_id)
+
+    def all_devices(self):
+        device_ids = self._cache.get("all")
+        if device_ids is None:
+            device_ids = [device["device_id"] for device in self._load()]
+            self._cache.set("all", device_ids)
+        return list(self.get_many(device_ids).values())
+
+    def devices_by_division_names(self, division_names):
+        device_ids, missing = [], []
+        for division_name in dict.fromkeys(division_names):
+            members = self._cache.get(("division", division_name))
+            if members is None:
+                missing.append(division_name)
+            else:
+                device_ids.extend(members)
+
+        if missing:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT dv.division_name, COALESCE(array_agg(dd.device_id) FILTER (WHERE dd.device_id IS NOT NULL), '{}')
+                        FROM divisions dv
+                        LEFT JOIN division_devices dd ON dd.division_id = dv.division_id
+                        WHERE dv.division_name = ANY(%s)
+                        GROUP BY dv.division_name
+                    """, (missing,))
+                    members_by_name = dict(cursor.fetchall())
+            for division_name in missing:
+                members = list(members_by_name.get(division_name, []))
+                self._cache.set(("division", division_name), members)
+                device_ids.extend(members)
+
+        return list(self.get_many(device_ids).values())
+
+    def invalidate(self):
+        self._cache.invalidate()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+device_registry = DeviceRegistry()
@@ -0,0 +1,111 @@
+import heapq
+import logging
+import select
+import time
+from config import DB_CONFIG
+from helpers.db_pool import listen_connection
+
+logger = logging.getLogger(__name__)
+
+
+class DueScheduler:
+    """Base loop for threads that act on rows when they fall due.
+
+    Due times are kept in an in-memory min-heap keyed by row id. The thread sleeps
+    until the earliest due time or until a NOTIFY arrives on `channel`, so nothing
+    is queried while idle. A slow reconciliation scan rebuilds the heap in case a
+    notification was lost (e.g. while the LISTEN connection was down).
+
+    Subclasses implement _reconcile (rebuild the heap with _reset_heap), _notified
+    (handle the set of NOTIFY payloads) and _fire (act on the ids that fell due).
+    """
+
+    channel = None
+    name = "scheduler"
+
+    def __init__(self, reconcile_interval):
+        self.reconcile_interval = reconcile_interval
+        self._heap = []  # (due_at epoch seconds, id)
+        self._due = {}  # id -> current due_at; heap entries that disagree are stale
+        self._listen_conn = None
+        self._next_reconcile = 0.0
+
+    def _close_listen(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+
+    def _schedule(self, key, due_at):
+        if self._due.get(key) == due_at:
+            return
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, key))
+
+    def _unschedule(self, key):
+        self._due.pop(key, None)
+
+    def _reset_heap(self, entries):
+        """Replace the heap with (due_at, id) entries from a full scan."""
+        self._heap = list(entries)
+        heapq.heapify(self._heap)
+        self._due = {key: due_at for due_at, key in self._heap}
+        self._next_reconcile = time.monotonic() + self.reconcile_interval
+
+    def _reconcile(self):
+        raise NotImplementedError
+
+    def _notified(self, payloads):
+        raise NotImplementedError
+
+    def _fire(self, keys):
+        raise NotImplementedError
+
+    def _drain_notifications(self):
+        self._listen_conn.poll()
+        payloads = set()
+        while self._listen_conn.notifies:
+            payloads.add(self._listen_conn.notifies.pop(0).payload)
+        if payloads:
+            self._notified(payloads)
+
+    def _pop_due(self):
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due_at:
+                del self._due[key]
+                due.append(key)
+        return due
+
+    def _wait_timeout(self):
+        timeout = self._next_reconcile - time.monotonic()
+        if self._heap:
+            timeout = min(timeout, self._heap[0][0] - time.time())
+        return max(timeout, 0)
+
+    def run_forever(self):
+        while True:
+            try:
+                if self._listen_conn is None or self._listen_conn.closed:
+                    # LISTEN before scanning so a row committed in between is not missed.
+                    self._listen_conn = listen_connection(DB_CONFIG, self.channel)
+                    self._reconcile()
+                elif time.monotonic() >= self._next_reconcile:
+                    self._reconcile()
+
+                due = self._pop_due()
+                if due:
+                    self._fire(due)
+                    continue
+
+                readable, _, _ = select.select([self._listen_conn], [], [], self._wait_timeout())
+                if readable:
+                    self._drain_notifications()
+            except Exception as e:
+                logger.error(f"Error in {self.name}: {e}")
+                self._close_listen()
+                time.sleep(5)
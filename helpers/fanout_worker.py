@@ -0,0 +1,184 @@
+import logging
+import select
+import time
+from config import DB_CONFIG, FANOUT_CHUNK_SIZE, FANOUT_JOB_MAX_ATTEMPTS, FANOUT_JOB_POLL_INTERVAL, FANOUT_JOB_STALE_AFTER, FANOUT_RETRY_BASE_SECONDS, FANOUT_RETRY_MAX_SECONDS
+from helpers.dashboard_helper import invalidate_dashboard_cache
+from helpers.db_pool import listen_connection
+from helpers.notification_helper import FANOUT_CHANNEL, get_db_connection, notify_workflow_changed
+from helpers.rollup_helper import rollup_workflow_devices
+
+logger = logging.getLogger(__name__)
+
+# Recipient sources per notification type, each yielding (device_id, division_id)
+# with one row per device so the chunks can be walked by device_id.
+_RECIPIENT_SOURCES = {
+    "All": "SELECT device_id, NULL::varchar AS division_id FROM devices",
+    "Division": """
+        SELECT DISTINCT ON (device_id) device_id, division_id
+        FROM division_devices
+        WHERE division_id = ANY(%(target_ids)s)
+        ORDER BY device_id, division_id
+    """,
+    "User": "SELECT DISTINCT device_id, NULL::varchar AS division_id FROM unnest(%(target_ids)s::varchar[]) AS t(device_id)",
+    # Resolved from the audience index when the job is created; devices deleted since
+    # the index last rebuilt are dropped here.
+    "Audience": "SELECT device_id, NULL::varchar AS division_id FROM devices WHERE device_id = ANY(%(target_ids)s)",
+}
+
+
+class FanoutWorker:
+    """Materialises device_workflows rows for background fan-out jobs.
+
+    Recipients are inserted FANOUT_CHUNK_SIZE rows per transaction, walking the
+    recipient set by device_id, so locks and WAL stay small and progress is visible
+    while a large workflow is prepared. The job row records the last device_id
+    written; a job whose worker stops heartbeating is picked up again from there.
+    A job that fails goes back to pending with exponential backoff and resumes
+    from its last chunk; it is only marked failed after FANOUT_JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, chunk_size=FANOUT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._listen_conn = None
+
+    def _close_listen(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+
+    def _claim_job(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE workflow_fanout_jobs
+                    SET state = 'running', updated_at = now()
+                    WHERE job_id = (
+                        SELECT job_id FROM workflow_fanout_jobs
+                        WHERE (state = 'pending' AND next_attempt_at <= now())
+                        OR (state = 'running' AND updated_at < now() - make_interval(secs => %s))
+                        ORDER BY created_at
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING job_id, workflow_id, notification_type, target_ids, last_key
+                """, (FANOUT_JOB_STALE_AFTER,))
+                return cursor.fetchone()
+
+    def _materialise_chunk(self, cursor, job_id, workflow_id, source, target_ids, last_key):
+        cursor.execute(f"""
+            WITH chunk AS (
+                SELECT device_id, division_id
+                FROM ({source}) recipients
+                WHERE device_id > %(last_key)s
+                ORDER BY device_id
+                LIMIT %(limit)s
+            ), inserted AS (
+                INSERT INTO device_workflows (device_id, workflow_id, ack, division_id)
+                SELECT device_id, %(workflow_id)s, FALSE, division_id FROM chunk
+                ON CONFLICT (workflow_id, device_id) DO NOTHING
+                RETURNING device_id
+            )
+            SELECT (SELECT COUNT(*) FROM chunk), (SELECT MAX(device_id) FROM chunk), ARRAY(SELECT device_id FROM inserted)
+        """, {
+            "target_ids": target_ids,
+            "last_key": last_key,
+            "limit": self.chunk_size,
+            "workflow_id": workflow_id,
+        })
+        # A job taken over from a stalled worker can replay a chunk that worker already
+        # wrote; only rows inserted here are counted, in the rollups, recipients_total and
+        # rows_materialised alike.
+        count, chunk_last_key, inserted = cursor.fetchone()
+        if inserted:
+            rollup_workflow_devices(cursor, workflow_id, inserted)
+            cursor.execute(
+                "UPDATE workflow SET recipients_total = recipients_total + %s WHERE unique_id = %s",
+                (len(inserted), workflow_id)
+            )
+
+        cursor.execute("""
+            UPDATE workflow_fanout_jobs
+            SET rows_materialised = rows_materialised + %s,
+                last_key = COALESCE(%s, last_key),
+                updated_at = now()
+            WHERE job_id = %s
+        """, (len(inserted), chunk_last_key, job_id))
+        return count, chunk_last_key
+
+    def run_job(self, job_id, workflow_id, notification_type, target_ids, last_key):
+        try:
+            source = _RECIPIENT_SOURCES[notification_type]
+            done = False
+            while not done:
+                with get_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        count, last_key = self._materialise_chunk(cursor, job_id, workflow_id, source, target_ids, last_key)
+                        if count < self.chunk_size:
+                            cursor.execute("UPDATE workflow SET fanout_pending = FALSE WHERE unique_id = %s", (workflow_id,))
+                            cursor.execute(
+                                "UPDATE workflow_fanout_jobs SET state = 'done', updated_at = now() WHERE job_id = %s",
+                                (job_id,)
+                            )
+                            notify_workflow_changed(cursor, workflow_id)
+                            done = True
+            invalidate_dashboard_cache()
+        except Exception as e:
+            logger.error(f"Fan-out job {job_id} failed: {e}")
+            self._mark_failed(job_id, e)
+
+    def _mark_failed(self, job_id, error):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE workflow_fanout_jobs
+                    SET attempts = attempts + 1,
+                        error = %s,
+                        state = CASE WHEN attempts + 1 >= {int(FANOUT_JOB_MAX_ATTEMPTS)} THEN 'failed' ELSE 'pending' END,
+                        next_attempt_at = now() + make_interval(secs => LEAST({float(FANOUT_RETRY_BASE_SECONDS)} * power(2, attempts), {float(FANOUT_RETRY_MAX_SECONDS)})),
+                        updated_at = now()
+                    WHERE job_id = %s
+                    RETURNING state
+                """, (str(error)[:1000], job_id))
+                row = cursor.fetchone()
+        if row and row[0] == 'failed':
+            logger.error(f"Fan-out job {job_id} gave up after {FANOUT_JOB_MAX_ATTEMPTS} attempts")
+
+    def _wait_timeout(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT EXTRACT(EPOCH FROM (MIN(next_attempt_at) - now()))
+                    FROM workflow_fanout_jobs
+                    WHERE state = 'pending'
+                """)
+                seconds = cursor.fetchone()[0]
+        if seconds is None:
+            return FANOUT_JOB_POLL_INTERVAL
+        return min(max(float(seconds), 0), FANOUT_JOB_POLL_INTERVAL)
+
+    def run_forever(self):
+        while True:
+            try:
+                if self._listen_conn is None or self._listen_conn.closed:
+                    self._listen_conn = listen_connection(DB_CONFIG, FANOUT_CHANNEL)
+
+                job = self._claim_job()
+                if job:
+                    self.run_job(*job)
+                    continue
+
+                readable, _, _ = select.select([self._listen_conn], [], [], self._wait_timeout())
+                if readable:
+                    self._listen_conn.poll()
+                    self._listen_conn.notifies.clear()
+            except Exception as e:
+                logger.error(f"Error in fan-out worker: {e}")
+                self._close_listen()
+                time.sleep(5)
+
+#build device_workflows rows for queued fan-out jobs
+def process_fanout_jobs():
+    FanoutWorker().run_forever()
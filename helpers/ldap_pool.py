@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import ldap3
+from ldap3.core.exceptions import LDAPBindError, LDAPException
+
+logger = logging.getLogger(__name__)
+
+
+class LdapPoolTimeout(Exception):
+    pass
+
+
+class LdapConnectionPool:
+    """Bounded, thread-safe pool of ldap3 connections.
+
+    With a bind user, connections are bound once as that account and reused
+    (service connections). Without one, connections are opened but left unbound,
+    for callers that rebind them with end-user credentials. Idle connections are
+    health checked with a root DSE read before reuse once they have been idle for
+    health_check_after seconds, and closed once idle for max_idle seconds.
+    Connections that raised an LDAP error are discarded and reopened on demand.
+    """
+
+    def __init__(self, server, user=None, password=None, max_size=5, timeout=10.0, health_check_after=30.0, max_idle=None):
+        self.server = server
+        self._user = user
+        self._password = password
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+
+        self._lock = threading.Condition()
+        self._idle = []  # (conn, returned_at)
+        self._size = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        conn = ldap3.Connection(self.server, user=self._user, password=self._password, read_only=False)
+        if self._user is None:
+            conn.open()
+        elif not conn.bind():
+            raise LDAPBindError(f"Failed to bind to the LDAP server: {conn.last_error}")
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if self.max_idle is not None and idle_for >= self.max_idle:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            return conn.search("", "(objectClass=*)", search_scope=ldap3.BASE, attributes=["1.1"])
+        except LDAPException:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.unbind()
+        except Exception:
+            pass
+        self._discarded += 1
+
+    def _prune(self):
+        # Close connections idle past max_idle so short-lived pools do not hold sockets open
+        if self.max_idle is None:
+            return
+        now = time.monotonic()
+        keep = []
+        for conn, returned_at in self._idle:
+            if now - returned_at >= self.max_idle:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                keep.append((conn, returned_at))
+        self._idle = keep
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            with self._lock:
+                self._prune()
+                while not self._idle and self._size >= self.max_size:
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise LdapPoolTimeout(f"Timed out after {self.timeout}s waiting for an LDAP connection")
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    create = False
+                else:
+                    conn, returned_at = None, None
+                    self._size += 1
+                    create = True
+                self._in_use += 1
+
+            # Connect and health check outside the lock so other borrowers are not blocked.
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(conn, time.monotonic() - returned_at):
+                with self._lock:
+                    self._discard(conn)
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._lock.notify()
+                continue
+
+            with self._lock:
+                self._checkouts += 1
+            return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded instead of reused if an LDAP error escapes."""
+        conn = self.getconn()
+        try:
+            yield conn
+        except LDAPException:
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+            }
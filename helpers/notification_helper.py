@@ -1,23 +1,65 @@
-import time
 from fastapi import HTTPException
 from google.cloud import pubsub_v1
-from config import DB_CONFIG, GCP_PROJECT_ID, PUBSUB_TOPIC, GOOGLE_APPLICATION_CREDENTIALS
-import psycopg2
+from config import DB_CONFIG, DB_POOL_HEALTH_CHECK_AFTER, DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE, DB_POOL_TIMEOUT, GCP_PROJECT_ID, PUBSUB_BATCH_MAX_BYTES, PUBSUB_BATCH_MAX_LATENCY, PUBSUB_BATCH_MAX_MESSAGES, PUBSUB_MAX_OUTSTANDING_MESSAGES, PUBSUB_TOPIC, WORKFLOW_CLAIM_BATCH_SIZE, WORKFLOW_RESEND_MAX_ATTEMPTS, WORKFLOW_RESEND_TIMEOUT, GOOGLE_APPLICATION_CREDENTIALS
 import json
 import os
-from datetime import datetime
+import threading
+from concurrent import futures
+from datetime import datetime, timezone
+from psycopg2.extras import execute_values
+from helpers.db_pool import ConnectionPool
 
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
 
-publisher = pubsub_v1.PublisherClient()
+# Batch outgoing messages so a large fan-out goes out in a few RPCs, and block
+# (rather than buffer without bound) once too many messages are in flight.
+publisher = pubsub_v1.PublisherClient(
+    batch_settings=pubsub_v1.types.BatchSettings(
+        max_messages=PUBSUB_BATCH_MAX_MESSAGES,
+        max_bytes=PUBSUB_BATCH_MAX_BYTES,
+        max_latency=PUBSUB_BATCH_MAX_LATENCY,
+    ),
+    publisher_options=pubsub_v1.types.PublisherOptions(
+        flow_control=pubsub_v1.types.PublishFlowControl(
+            message_limit=PUBSUB_MAX_OUTSTANDING_MESSAGES,
+            limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.BLOCK,
+        ),
+    ),
+)
 topic_name = f"projects/{GCP_PROJECT_ID}/topics/{PUBSUB_TOPIC}"
 
+WORKFLOW_CHANNEL = "workflow_changed"
+OUTBOX_CHANNEL = "notification_outbox"
+FANOUT_CHANNEL = "workflow_fanout_jobs"
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+#shared connection pool, created on first use
+def get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    DB_CONFIG,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                )
+    return _db_pool
+
+#borrow a pooled connection; close() hands it back to the pool, and using it as a context
+#manager also commits on success or rolls back on error
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    return get_db_pool().getconn()
+
+def get_db_pool_stats():
+    return get_db_pool().stats()
 
-#publish messgage to pub/sub
-def publish_message(notification_id,name , body, priority, device_id, timestamp):
+def build_message(notification_id, name, body, priority, device_id, timestamp):
     message = {
         "notification_id": notification_id,
         "name": name,
@@ -26,112 +68,209 @@ def publish_message(notification_id,name , body, priority, device_id, timestamp)
         "device_id": device_id,
         "timestamp": timestamp.isoformat()
     }
-    try:
-        future = publisher.publish(topic_name, json.dumps(message).encode("utf-8"))
-        message_id = future.result()
-        print(f"Published notification {notification_id} to device {device_id} with message ID: {message_id}")
-    except Exception as e:
-        print(f"Error publishing message: {e}")
-
-#handle scheduled workflows
-def process_scheduled_notifications():
-    while True:
-        try:
-            current_time = datetime.now()
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT 
-                w.unique_id, 
-                w.name,
-                w.body, 
-                w.priority, 
-                w.time AS timestamp, 
-                dw.device_id
-                FROM 
-                workflow w
-                JOIN 
-                device_workflows dw 
-                ON w.unique_id = dw.workflow_id
-                WHERE w.time <= %s AND w.published = FALSE AND w.status = 'live'
-                """, (current_time,))
-
-            notifications = cursor.fetchall()
-            print(f"Found {len(notifications)} notifications to publish")
-            for notif_id,name, body, priority, timestamp, device_id in notifications:
-                publish_message(notif_id,name, body, priority, device_id, timestamp)
-
-                cursor.execute("""
-                    UPDATE workflow
-                    SET published = TRUE
-                    WHERE unique_id = %s
-                """, (notif_id,))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            time.sleep(5)
-        except Exception as e:
-            print(f"Error in background task: {e}")
-            time.sleep(5)
-
-#insert device workflows
-def insert_device_workflows(cursor, workflow_id, target_devices):
-    for device_info in target_devices:
-        if isinstance(device_info, tuple):
-            device, division_id = device_info
-        else:
-            device = device_info
-            division_id = None
-
-        if division_id is not None:
-            cursor.execute(
-                """
-                INSERT INTO device_workflows (device_id, workflow_id, ack, division_id)
-                VALUES (%s, %s, %s, %s)
-                """,
-                (device, workflow_id, False, division_id)
-            )
+    return json.dumps(message).encode("utf-8")
+
+#publish many messages concurrently and wait on all the futures together;
+#messages are (key, data) pairs, failures come back as (key, error)
+def publish_messages(messages):
+    pending = {}
+    for key, data in messages:
+        pending[publisher.publish(topic_name, data)] = key
+
+    futures.wait(pending)
+
+    published, failed = [], []
+    for future, key in pending.items():
+        error = future.exception()
+        if error is None:
+            published.append(key)
         else:
-            cursor.execute(
-                """
-                INSERT INTO device_workflows (device_id, workflow_id, ack)
-                VALUES (%s, %s, %s)
-                """,
-                (device, workflow_id, False)
-            )
-
-#get target devices to create workflow
-def get_target_devices(cursor, workflow):
+            failed.append((key, error))
+    return published, failed
+
+#tell the workflow dispatcher that a workflow was created or changed (delivered on commit)
+def notify_workflow_changed(cursor, workflow_id):
+    cursor.execute("SELECT pg_notify(%s, %s)", (WORKFLOW_CHANNEL, str(workflow_id)))
+
+#claim due workflows for this process; rows stay locked (and skipped by other dispatchers) until commit
+def claim_due_workflows(cursor, workflow_ids=None, limit=WORKFLOW_CLAIM_BATCH_SIZE):
+    query = """
+        SELECT unique_id
+        FROM workflow
+        WHERE time <= %s AND published = FALSE AND status = 'live' AND fanout_pending = FALSE
+    """
+    params = [datetime.now(timezone.utc)]
+    if workflow_ids is not None:
+        query += " AND unique_id = ANY(%s)"
+        params.append(list(workflow_ids))
+    query += " ORDER BY time LIMIT %s FOR UPDATE SKIP LOCKED"
+    params.append(limit)
+
+    cursor.execute(query, tuple(params))
+    return [row[0] for row in cursor.fetchall()]
+
+#wake the outbox delivery worker (delivered on commit)
+def notify_outbox(cursor):
+    cursor.execute("SELECT pg_notify(%s, '')", (OUTBOX_CHANNEL,))
+
+#move one claimed batch of due workflows into the notification outbox, one row per device,
+#in the same transaction that marks the workflows published
+def enqueue_due_workflows(cursor, workflow_ids=None):
+    claimed = claim_due_workflows(cursor, workflow_ids)
+    if not claimed:
+        return []
+
+    cursor.execute("""
+        INSERT INTO notification_outbox (workflow_id, device_id)
+        SELECT dw.workflow_id, dw.device_id
+        FROM device_workflows dw
+        WHERE dw.workflow_id = ANY(%s) AND dw.device_id IS NOT NULL
+        ON CONFLICT (workflow_id, device_id) DO NOTHING
+    """, (claimed,))
+    print(f"Queued {cursor.rowcount} notifications for {len(claimed)} workflows")
+
+    cursor.execute("""
+        UPDATE workflow
+        SET published = TRUE
+        WHERE unique_id = ANY(%s)
+    """, (claimed,))
+    notify_outbox(cursor)
+    return claimed
+
+#put the delivered-but-unacknowledged messages of a workflow back in the outbox; only rows
+#last sent at least `timeout` seconds ago and re-sent fewer than `max_attempts` times qualify
+def resend_unacked(cursor, workflow_id, timeout=WORKFLOW_RESEND_TIMEOUT, max_attempts=WORKFLOW_RESEND_MAX_ATTEMPTS):
+    cursor.execute("""
+        UPDATE notification_outbox o
+        SET state = 'pending', attempts = 0, next_attempt_at = now(), last_error = NULL, resends = o.resends + 1
+        FROM device_workflows dw
+        WHERE dw.workflow_id = %s
+        AND dw.ack IS NOT TRUE
+        AND o.workflow_id = dw.workflow_id
+        AND o.device_id = dw.device_id
+        AND o.state = 'sent'
+        AND o.resends < %s
+        AND o.sent_at <= now() - make_interval(secs => %s)
+    """, (workflow_id, max_attempts, timeout))
+    queued = cursor.rowcount
+    if queued:
+        notify_outbox(cursor)
+    return queued
+
+#fetch dead-lettered notifications
+def fetch_dead_letters(cursor, workflow_id=None, limit=100):
+    query = """
+        SELECT id, workflow_id, device_id, attempts, last_error, created_at, next_attempt_at
+        FROM notification_outbox
+        WHERE state = 'dead'
+    """
+    params = []
+    if workflow_id is not None:
+        query += " AND workflow_id = %s"
+        params.append(workflow_id)
+    query += " ORDER BY id DESC LIMIT %s"
+    params.append(limit)
+
+    cursor.execute(query, tuple(params))
+    return [
+        {
+            "outbox_id": row[0],
+            "workflow_id": row[1],
+            "device_id": row[2],
+            "attempts": row[3],
+            "last_error": row[4],
+            "created_at": row[5],
+            "last_attempt_at": row[6]
+        } for row in cursor.fetchall()
+    ]
+
+#validate the targeting part of a workflow request
+def validate_target(workflow):
     if workflow.NotificationType == "All":
-        cursor.execute("SELECT device_id FROM devices")
-        return [row[0] for row in cursor.fetchall()]
+        return
 
     elif workflow.NotificationType == "Division":
         if not workflow.ids or not isinstance(workflow.ids, list):
             raise HTTPException(status_code=400, detail="'ids' must be a list of division IDs for 'division' workflows.")
 
-        target_devices = []
-        for division_id in workflow.ids:
-            cursor.execute(
-                "SELECT device_id FROM division_devices WHERE division_id = %s;",
-                (division_id,)
-            )
-            division_devices = [row[0] for row in cursor.fetchall()]
-            target_devices.extend([(device, division_id) for device in division_devices])
-        return target_devices
-
     elif workflow.NotificationType == "User":
         if not workflow.ids:
             raise HTTPException(status_code=400, detail="'ids' must be provided for 'select user' workflows.")
-        return workflow.ids
+
+    elif workflow.NotificationType == "Audience":
+        if not workflow.ids:
+            raise HTTPException(status_code=400, detail="The audience does not match any devices.")
 
     else:
         raise HTTPException(status_code=400, detail="Invalid NotificationType provided.")
-    
+
+#fan a workflow out to its target devices in bulk; "All" and "Division" are resolved
+#server-side with INSERT ... SELECT, explicit device ids go in as one multi-row insert
+def insert_target_devices(cursor, workflow_id, workflow):
+    validate_target(workflow)
+
+    if workflow.NotificationType == "All":
+        cursor.execute(
+            """
+            INSERT INTO device_workflows (device_id, workflow_id, ack)
+            SELECT device_id, %s, FALSE FROM devices
+            """,
+            (workflow_id,)
+        )
+
+    elif workflow.NotificationType == "Division":
+        # A device in several selected divisions gets one row, tagged with one of them.
+        cursor.execute(
+            """
+            INSERT INTO device_workflows (device_id, workflow_id, ack, division_id)
+            SELECT DISTINCT ON (dd.device_id) dd.device_id, %s, FALSE, dd.division_id
+            FROM division_devices dd
+            WHERE dd.division_id = ANY(%s)
+            ORDER BY dd.device_id, dd.division_id
+            """,
+            (workflow_id, list(workflow.ids))
+        )
+
+    elif workflow.NotificationType == "Audience":
+        # The audience index only drops deleted devices on its periodic rebuild, so the
+        # resolved ids are checked against devices here.
+        cursor.execute(
+            """
+            INSERT INTO device_workflows (device_id, workflow_id, ack)
+            SELECT device_id, %s, FALSE FROM devices
+            WHERE device_id = ANY(%s)
+            """,
+            (workflow_id, list(workflow.ids))
+        )
+
+    elif workflow.NotificationType == "User":
+        execute_values(
+            cursor,
+            "INSERT INTO device_workflows (device_id, workflow_id, ack) VALUES %s",
+            [(device_id, workflow_id, False) for device_id in dict.fromkeys(workflow.ids)],
+            page_size=1000
+        )
+
+    refresh_recipient_counts(cursor, workflow_id)
+
+#recount a workflow's recipient and ack counters after its device_workflows rows were replaced
+def refresh_recipient_counts(cursor, workflow_id):
+    cursor.execute(
+        """
+        UPDATE workflow
+        SET recipients_total = c.total, recipients_acked = c.acked
+        FROM (
+            SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE ack) AS acked
+            FROM device_workflows
+            WHERE workflow_id = %s
+        ) c
+        WHERE unique_id = %s
+        """,
+        (workflow_id, workflow_id)
+    )
+
 #insert in workflow
-def insert_workflow(cursor, workflow):
+def insert_workflow(cursor, workflow, fanout_pending=False):
     timestamp = workflow.timestamp or datetime.now()
     status = workflow.status or 'live'
 
@@ -142,29 +281,103 @@ def insert_workflow(cursor, workflow):
 
     cursor.execute(
         """
-        INSERT INTO workflow (unique_id, name, workflow_type, time, status, notification_type, ack, published, body, priority)
-        VALUES (gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        INSERT INTO workflow (unique_id, name, workflow_type, time, status, notification_type, ack, published, body, priority, fanout_pending)
+        VALUES (gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         RETURNING unique_id
         """,
-        (workflow.name, workflow.WorkflowType, timestamp, status, notification_type, False, False, workflow.body, workflow.priority)
+        (workflow.name, workflow.WorkflowType, timestamp, status, notification_type, False, False, workflow.body, workflow.priority, fanout_pending)
     )
-    return cursor.fetchone()[0]
+    workflow_id = cursor.fetchone()[0]
+    notify_workflow_changed(cursor, workflow_id)
+    return workflow_id
 
-#fetch workflows
-def fetch_workflow_records(cursor):
-    query = """
+#queue a background fan-out job; the workflow is held back from dispatch until it finishes
+def create_fanout_job(cursor, workflow_id, workflow):
+    validate_target(workflow)
+    cursor.execute(
+        """
+        INSERT INTO workflow_fanout_jobs (workflow_id, notification_type, target_ids)
+        VALUES (%s, %s, %s)
+        RETURNING job_id
+        """,
+        (workflow_id, workflow.NotificationType.value, workflow.ids)
+    )
+    job_id = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_notify(%s, %s)", (FANOUT_CHANNEL, job_id))
+    return job_id
+
+#fetch fan-out job progress
+def fetch_fanout_job(cursor, job_id):
+    cursor.execute(
+        """
+        SELECT j.job_id, j.workflow_id, j.state, j.rows_materialised, j.error, j.created_at, j.updated_at,
+               j.attempts, j.next_attempt_at,
+               COUNT(o.id) AS rows_queued,
+               COUNT(o.id) FILTER (WHERE o.state = 'sent') AS rows_published
+        FROM workflow_fanout_jobs j
+        LEFT JOIN notification_outbox o ON o.workflow_id = j.workflow_id
+        WHERE j.job_id = %s
+        GROUP BY j.job_id
+        """,
+        (job_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        "job_id": row[0],
+        "workflow_id": row[1],
+        "state": row[2],
+        "rows_materialised": row[3],
+        "error": row[4],
+        "created_at": row[5],
+        "updated_at": row[6],
+        "attempts": row[7],
+        "next_attempt_at": row[8],
+        "rows_queued": row[9],
+        "rows_published": row[10]
+    }
+
+#fetch one page of workflows, newest first
+def fetch_workflow_records(cursor, limit=50, after=None, status=None, priority=None, notification_type=None, published=None, time_from=None, time_to=None):
+    conditions = []
+    params = []
+
+    if after is not None:
+        conditions.append("(workflow.time, workflow.unique_id) < (%s, %s)")
+        params.extend(after)
+    for column, value in (
+        ("status", status),
+        ("priority", priority),
+        ("notification_type", notification_type),
+        ("published", published),
+    ):
+        if value is not None:
+            conditions.append(f"workflow.{column} = %s")
+            params.append(value)
+    if time_from is not None:
+        conditions.append("workflow.time >= %s")
+        params.append(time_from)
+    if time_to is not None:
+        conditions.append("workflow.time < %s")
+        params.append(time_to)
+
+    query = f"""
         SELECT unique_id AS workflow_id, workflow.name, workflow.workflow_type, workflow.time, workflow.status, workflow.body, workflow.priority,
-        workflow.notification_type ,workflow.published , workflow.ack
+        workflow.notification_type ,workflow.published , workflow.ack, workflow.recipients_total, workflow.recipients_acked
         FROM workflow
-        ORDER BY workflow.time DESC
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY workflow.time DESC, workflow.unique_id DESC
+        LIMIT %s
     """
-    cursor.execute(query)
+    params.append(limit)
+    cursor.execute(query, tuple(params))
     return cursor.fetchall()
 
 def format_workflow_records(records):
     workflows = []
     for record in records:
-        unique_id, name, workflow_type, schedule_time, status, body, priority, notification_type, published , ack = record
+        unique_id, name, workflow_type, schedule_time, status, body, priority, notification_type, published , ack, recipients_total, recipients_acked = record
         workflow_details = {
             "workflow_id": unique_id,
             "name": name,
@@ -175,7 +388,34 @@ def format_workflow_records(records):
             "priority": priority,
             "notification_type": notification_type,
             "published": published,
-            "ack": ack
+            "ack": ack,
+            "recipients_total": recipients_total,
+            "recipients_acked": recipients_acked,
+            "delivery_percentage": round(recipients_acked * 100 / recipients_total, 2) if recipients_total else 0
         }
         workflows.append(workflow_details)
-    return workflows
\ No newline at end of file
+    return workflows
+
+#fetch one page of a workflow's recipients ordered by device_id, optionally only acked or unacked ones
+def fetch_workflow_acks(cursor, workflow_id, limit=100, after=None, acked=None):
+    conditions = ["dw.workflow_id = %s"]
+    params = [workflow_id]
+
+    if after is not None:
+        conditions.append("dw.device_id > %s")
+        params.append(after)
+    if acked is True:
+        conditions.append("dw.ack = TRUE")
+    elif acked is False:
+        conditions.append("dw.ack IS NOT TRUE")
+
+    params.append(limit)
+    cursor.execute(f"""
+        SELECT dw.device_id, dw.ack, d.os_type
+        FROM device_workflows dw
+        JOIN devices d ON dw.device_id = d.device_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY dw.device_id
+        LIMIT %s
+    """, tuple(params))
+    return cursor.fetchall()
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+import select
+import time
+from psycopg2.extras import execute_values
+from config import DB_CONFIG, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_IDLE_WAIT, OUTBOX_MIN_WAIT, OUTBOX_RETRY_BASE_SECONDS, OUTBOX_RETRY_MAX_SECONDS
+from helpers.db_pool import listen_connection
+from helpers.notification_helper import OUTBOX_CHANNEL, build_message, get_db_connection, publish_messages
+from helpers.progress_helper import progress_hub
+from helpers.rollup_helper import rollup_dead_letters
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """Delivers pending notification_outbox rows to Pub/Sub.
+
+    Each row is one device message with its own state, attempt count and next retry
+    time. Rows are claimed with SKIP LOCKED, so several workers split even a single
+    large workflow between them. A failed publish only reschedules that row, with
+    exponential backoff, until it is dead-lettered after OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._listen_conn = None
+
+    def _close_listen(self):
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+
+    def _claim(self, cursor):
+        cursor.execute("""
+            SELECT o.id, o.workflow_id, w.name, w.body, w.priority, w.time, o.device_id
+            FROM notification_outbox o
+            JOIN workflow w ON w.unique_id = o.workflow_id
+            WHERE o.state = 'pending' AND o.next_attempt_at <= now()
+            ORDER BY o.next_attempt_at
+            LIMIT %s
+            FOR UPDATE OF o SKIP LOCKED
+        """, (self.batch_size,))
+        return cursor.fetchall()
+
+    def _mark_sent(self, cursor, outbox_ids):
+        cursor.execute("""
+            UPDATE notification_outbox
+            SET state = 'sent', attempts = attempts + 1, sent_at = now(), last_error = NULL
+            WHERE id = ANY(%s)
+        """, (outbox_ids,))
+
+    def _mark_failed(self, cursor, failures):
+        rows = execute_values(cursor, f"""
+            UPDATE notification_outbox o
+            SET attempts = o.attempts + 1,
+                last_error = f.error,
+                state = CASE WHEN o.attempts + 1 >= {int(OUTBOX_MAX_ATTEMPTS)} THEN 'dead' ELSE 'pending' END,
+                next_attempt_at = now() + make_interval(secs => LEAST({float(OUTBOX_RETRY_BASE_SECONDS)} * power(2, o.attempts), {float(OUTBOX_RETRY_MAX_SECONDS)}))
+            FROM (VALUES %s) AS f(id, error)
+            WHERE o.id = f.id
+            RETURNING o.id, o.state
+        """, [(outbox_id, str(error)[:1000]) for outbox_id, error in failures], fetch=True)
+
+        dead = [outbox_id for outbox_id, state in rows if state == 'dead']
+        if dead:
+            rollup_dead_letters(cursor, dead)
+
+    def deliver_batch(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                rows = self._claim(cursor)
+                if not rows:
+                    return 0
+
+                messages = [
+                    (outbox_id, build_message(workflow_id, name, body, priority, device_id, timestamp))
+                    for outbox_id, workflow_id, name, body, priority, timestamp, device_id in rows
+                ]
+                published, failed = publish_messages(messages)
+
+                if published:
+                    self._mark_sent(cursor, published)
+                if failed:
+                    logger.warning(f"{len(failed)} of {len(rows)} outbox messages failed to publish")
+                    self._mark_failed(cursor, failed)
+
+        if published:
+            workflow_by_outbox_id = {row[0]: row[1] for row in rows}
+            progress_hub.publish_sent(workflow_by_outbox_id[outbox_id] for outbox_id in published)
+        return len(rows)
+
+    def _wait_timeout(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT EXTRACT(EPOCH FROM (MIN(next_attempt_at) - now()))
+                    FROM notification_outbox
+                    WHERE state = 'pending'
+                """)
+                seconds = cursor.fetchone()[0]
+        if seconds is None:
+            return OUTBOX_MAX_IDLE_WAIT
+        return min(max(float(seconds), 0), OUTBOX_MAX_IDLE_WAIT)
+
+    def run_forever(self):
+        while True:
+            try:
+                if self._listen_conn is None or self._listen_conn.closed:
+                    self._listen_conn = listen_connection(DB_CONFIG, OUTBOX_CHANNEL)
+
+                claimed = self.deliver_batch()
+                if claimed >= self.batch_size:
+                    continue
+
+                timeout = self._wait_timeout()
+                if claimed == 0:
+                    # Due rows that could not be claimed are locked by a peer worker;
+                    # back off instead of re-polling until it commits.
+                    timeout = max(timeout, OUTBOX_MIN_WAIT)
+                readable, _, _ = select.select([self._listen_conn], [], [], timeout)
+                if readable:
+                    self._listen_conn.poll()
+                    self._listen_conn.notifies.clear()
+            except Exception as e:
+                logger.error(f"Error in outbox worker: {e}")
+                self._close_listen()
+                time.sleep(5)
+
+#deliver queued notifications
+def process_notification_outbox():
+    OutboxWorker().run_forever()
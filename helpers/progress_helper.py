@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict
+from config import PROGRESS_QUEUE_SIZE, PROGRESS_RESYNC_INTERVAL
+from helpers.async_helper import run_blocking
+from helpers.notification_helper import get_db_connection
+
+#current delivery counters for one workflow
+def fetch_workflow_progress(workflow_id):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT w.recipients_total,
+                       w.recipients_acked,
+                       (SELECT COUNT(*) FROM notification_outbox o WHERE o.workflow_id = w.unique_id AND o.state = 'sent')
+                FROM workflow w
+                WHERE w.unique_id = %s
+            """, (workflow_id,))
+            total, acked, published = cursor.fetchone() or (0, 0, 0)
+    return {"total": total, "published": published, "acked": acked}
+
+
+class _Channel:
+    def __init__(self):
+        self.counters = None
+        self.loaded_at = 0.0
+        self.subscribers = set()  # (loop, queue)
+
+
+class ProgressHub:
+    """Fans in-process delivery changes out to live progress streams.
+
+    Counters for a watched workflow are loaded once, however many clients watch it,
+    and then moved by the ack flusher and outbox worker as they commit. Changes made
+    by other processes are picked up by reloading the counters every
+    PROGRESS_RESYNC_INTERVAL seconds per workflow. The deadline is wall-clock, so a
+    stream that keeps receiving local events still resyncs on time.
+
+    Events carry absolute counters, so a slow client whose queue is full only misses
+    the device ids of the events dropped for it.
+    """
+
+    def __init__(self, queue_size=PROGRESS_QUEUE_SIZE, resync_interval=PROGRESS_RESYNC_INTERVAL):
+        self.queue_size = queue_size
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    @staticmethod
+    def _snapshot(counters):
+        return {**counters, "pending": counters["total"] - counters["acked"]}
+
+    @staticmethod
+    def _offer(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    def _broadcast(self, channel, event):
+        for loop, queue in channel.subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                pass  # the subscriber's event loop has closed
+
+    async def subscribe(self, workflow_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            channel = self._channels.setdefault(workflow_id, _Channel())
+            channel.subscribers.add((asyncio.get_running_loop(), queue))
+        # Registered before the snapshot so no event between the two is missed; a failed
+        # snapshot must take the queue back out, or it keeps receiving events forever.
+        try:
+            resynced = await self.resync(workflow_id)
+        except BaseException:
+            self.unsubscribe(workflow_id, queue)
+            raise
+        if not resynced:
+            # Counters already loaded for earlier subscribers; start this one from them
+            with self._lock:
+                counters = channel.counters
+                if counters is not None:
+                    self._offer(queue, {"counters": self._snapshot(counters), "acked_device_ids": []})
+        return queue
+
+    def unsubscribe(self, workflow_id, queue):
+        with self._lock:
+            channel = self._channels.get(workflow_id)
+            if channel is None:
+                return
+            channel.subscribers = {(loop, q) for loop, q in channel.subscribers if q is not queue}
+            if not channel.subscribers:
+                del self._channels[workflow_id]
+
+    def resync_due_in(self, workflow_id):
+        """Seconds until the workflow's counters should be reloaded (<= 0 when due)."""
+        with self._lock:
+            channel = self._channels.get(workflow_id)
+            if channel is None:
+                return self.resync_interval
+            return channel.loaded_at + self.resync_interval - time.monotonic()
+
+    async def resync(self, workflow_id):
+        """Reload the counters if they are missing or stale and broadcast them; returns whether it did."""
+        with self._lock:
+            channel = self._channels.get(workflow_id)
+            if channel is None or time.monotonic() - channel.loaded_at < self.resync_interval:
+                return False
+            channel.loaded_at = time.monotonic()
+        try:
+            counters = await run_blocking(fetch_workflow_progress, workflow_id)
+        except Exception:
+            with self._lock:
+                channel.loaded_at = 0.0
+            raise
+        with self._lock:
+            channel = self._channels.get(workflow_id)
+            if channel is None:
+                return False
+            channel.counters = counters
+            self._broadcast(channel, {"counters": self._snapshot(counters), "acked_device_ids": []})
+        return True
+
+    def publish_acks(self, acks):
+        """Record newly acknowledged (workflow_id, device_id) pairs."""
+        by_workflow = defaultdict(list)
+        for workflow_id, device_id in acks:
+            by_workflow[workflow_id].append(device_id)
+        with self._lock:
+            for workflow_id, device_ids in by_workflow.items():
+                channel = self._channels.get(workflow_id)
+                if channel is None or channel.counters is None:
+                    continue
+                channel.counters["acked"] += len(device_ids)
+                self._broadcast(channel, {"counters": self._snapshot(channel.counters), "acked_device_ids": device_ids})
+
+    def publish_sent(self, workflow_ids):
+        """Record one published message per workflow id given."""
+        with self._lock:
+            for workflow_id, count in Counter(workflow_ids).items():
+                channel = self._channels.get(workflow_id)
+                if channel is None or channel.counters is None:
+                    continue
+                channel.counters["published"] += count
+                self._broadcast(channel, {"counters": self._snapshot(channel.counters), "acked_device_ids": []})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workflows": len(self._channels),
+                "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+            }
+
+
+progress_hub = ProgressHub()
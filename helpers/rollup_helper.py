@@ -0,0 +1,99 @@
+import sys
+from helpers.notification_helper import get_db_connection
+from helpers.sketch_helper import LOG_GAMMA, MIN_VALUE
+
+_ROLLUP_COLUMNS = "bucket, priority, workflow_type, division, device_type, sent, acked, failed"
+_ROLLUP_KEY = "bucket, priority, workflow_type, division, device_type"
+
+#add per-bucket deltas for the device_workflows rows matching `where` to the hourly and daily rollups;
+#sent/acked/failed are SQL aggregates over dw (device_workflows), w (workflow), d (devices), o (outbox)
+def apply_rollup_delta(cursor, where, params=(), sent="COUNT(*)", acked="COUNT(*) FILTER (WHERE dw.ack)", failed="COUNT(*) FILTER (WHERE o.state = 'dead')"):
+    cursor.execute(f"""
+        WITH delta AS (
+            SELECT date_trunc('hour', w.time) AS bucket,
+                   COALESCE(w.priority, '') AS priority,
+                   w.workflow_type,
+                   COALESCE(d.division, '') AS division,
+                   COALESCE(d.device_type, '') AS device_type,
+                   {sent} AS sent,
+                   {acked} AS acked,
+                   {failed} AS failed
+            FROM device_workflows dw
+            JOIN workflow w ON w.unique_id = dw.workflow_id
+            LEFT JOIN devices d ON d.device_id = dw.device_id
+            LEFT JOIN notification_outbox o ON o.workflow_id = dw.workflow_id AND o.device_id = dw.device_id
+            WHERE {where}
+            GROUP BY 1, 2, 3, 4, 5
+        ), hourly AS (
+            INSERT INTO delivery_rollup_hourly AS r ({_ROLLUP_COLUMNS})
+            SELECT {_ROLLUP_COLUMNS} FROM delta
+            ON CONFLICT ({_ROLLUP_KEY}) DO UPDATE
+            SET sent = r.sent + EXCLUDED.sent, acked = r.acked + EXCLUDED.acked, failed = r.failed + EXCLUDED.failed
+        )
+        INSERT INTO delivery_rollup_daily AS r ({_ROLLUP_COLUMNS})
+        SELECT date_trunc('day', bucket), priority, workflow_type, division, device_type, SUM(sent), SUM(acked), SUM(failed)
+        FROM delta
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT ({_ROLLUP_KEY}) DO UPDATE
+        SET sent = r.sent + EXCLUDED.sent, acked = r.acked + EXCLUDED.acked, failed = r.failed + EXCLUDED.failed
+    """, params)
+
+#count (sign=1) or uncount (sign=-1) every recipient row of a workflow
+def rollup_workflow(cursor, workflow_id, sign=1):
+    apply_rollup_delta(
+        cursor, "dw.workflow_id = %s", (workflow_id,),
+        sent=f"{int(sign)} * COUNT(*)",
+        acked=f"{int(sign)} * COUNT(*) FILTER (WHERE dw.ack)",
+        failed=f"{int(sign)} * COUNT(*) FILTER (WHERE o.state = 'dead')"
+    )
+
+#count the given recipient rows of a workflow (the rows one background fan-out chunk inserted)
+def rollup_workflow_devices(cursor, workflow_id, device_ids):
+    apply_rollup_delta(
+        cursor, "dw.workflow_id = %s AND dw.device_id = ANY(%s)",
+        (workflow_id, list(device_ids))
+    )
+
+#count outbox rows that were just dead-lettered as failed deliveries
+def rollup_dead_letters(cursor, outbox_ids):
+    apply_rollup_delta(
+        cursor, "o.id = ANY(%s)", (list(outbox_ids),),
+        sent="0", acked="0", failed="COUNT(*)"
+    )
+
+#add the ack latencies of the acknowledged device_workflows rows matching `where` to the
+#per-bucket latency sketches (see helpers/sketch_helper.py for the binning)
+def record_ack_latencies(cursor, where, params=()):
+    cursor.execute(f"""
+        INSERT INTO ack_latency_sketch_bins AS s (bucket, priority, division, bin, count)
+        SELECT date_trunc('hour', w.time),
+               COALESCE(w.priority, ''),
+               COALESCE(d.division, ''),
+               CEIL(LN(GREATEST(EXTRACT(EPOCH FROM (dw.acknowledged_at - dw.created_at)), {float(MIN_VALUE)})) / {float(LOG_GAMMA)})::int,
+               COUNT(*)
+        FROM device_workflows dw
+        JOIN workflow w ON w.unique_id = dw.workflow_id
+        LEFT JOIN devices d ON d.device_id = dw.device_id
+        WHERE ({where}) AND dw.ack = TRUE AND dw.acknowledged_at IS NOT NULL AND dw.created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (bucket, priority, division, bin) DO UPDATE
+        SET count = s.count + EXCLUDED.count
+    """, params)
+
+#rebuild the rollup tables and latency sketches from the raw delivery rows
+def rebuild_rollups():
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("LOCK TABLE delivery_rollup_hourly, delivery_rollup_daily, ack_latency_sketch_bins IN EXCLUSIVE MODE")
+            cursor.execute("TRUNCATE delivery_rollup_hourly, delivery_rollup_daily, ack_latency_sketch_bins")
+            apply_rollup_delta(cursor, "TRUE")
+            record_ack_latencies(cursor, "TRUE")
+            cursor.execute("SELECT COUNT(*) FROM delivery_rollup_hourly")
+            return cursor.fetchone()[0]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m helpers.rollup_helper rebuild")
+        sys.exit(2)
+    print(f"Rebuilt delivery rollups: {rebuild_rollups()} hourly buckets")
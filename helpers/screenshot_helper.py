@@ -2,9 +2,12 @@ import json
 import logging
 from typing import List
 from config import GCP_PROJECT_ID, PUBSUB_TOPIC
+from helpers.device_registry import device_registry
 from helpers.notification_helper import get_db_connection
 from google.cloud import pubsub_v1
-from datetime import datetime, timedelta
+from concurrent import futures
+from datetime import datetime
+from psycopg2.extras import execute_values
 
 publisher = pubsub_v1.PublisherClient()
 topic_path = publisher.topic_path(GCP_PROJECT_ID, PUBSUB_TOPIC)
@@ -12,95 +15,57 @@ topic_path = publisher.topic_path(GCP_PROJECT_ID, PUBSUB_TOPIC)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_device_name(device_id):
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        query = "SELECT device_name FROM devices WHERE device_id = %s"
-        cursor.execute(query, (device_id,))
-        
-        result = cursor.fetchone()
-        return result[0] if result else None
-    except Exception as e:
-        logger.error(f"Error fetching device name: {str(e)}")
-        return None
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
+# NOTIFY channel for auto-screenshot timer changes; the payload is a device_id, or ''
+# when every timer may have changed
+SCREENSHOT_TIMER_CHANNEL = "screenshot_timers"
 
-def store_screenshot_request_screenshots(device_id):
-    try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        query = "INSERT INTO screenshots (device_id) VALUES (%s) RETURNING id;"
-        cursor.execute(query, (device_id,))
-        screenshot_id = cursor.fetchone()[0]
-        connection.commit()
-        
-        return screenshot_id
-    except Exception as e:
-        logger.error(f"Error storing screenshot request: {str(e)}")
-        return None
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
+#tell the screenshot scheduler which timers changed (delivered on commit)
+def notify_timers_changed(cursor, device_ids=None):
+    if device_ids is None:
+        cursor.execute("SELECT pg_notify(%s, '')", (SCREENSHOT_TIMER_CHANNEL,))
+    elif device_ids:
+        cursor.execute("SELECT pg_notify(%s, d) FROM unnest(%s::varchar[]) AS t(d)", (SCREENSHOT_TIMER_CHANNEL, list(device_ids)))
 
-def update_screenshot(screenshot_id):
+def get_device_name(device_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query = "UPDATE screenshots SET ispublished = TRUE WHERE id = %s RETURNING id;"
-        cursor.execute(query, (screenshot_id,))
-        result = cursor.fetchone()
-        conn.commit()
-
-        return result
+        device = device_registry.get(device_id)
+        return device["device_name"] if device else None
     except Exception as e:
-        logger.error(f"Error update screenshot request: {str(e)}")
+        logger.error(f"Error fetching device name: {str(e)}")
         return None
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
 
 def get_devices_by_division_names(division_names: List[str]):
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        query = """
-        SELECT d.device_id, d.device_name FROM devices d
-        JOIN division_devices dd ON d.device_id = dd.device_id
-        JOIN divisions dv ON dd.division_id = dv.division_id
-        WHERE dv.division_name = ANY(%s)
-        """
-        cursor.execute(query, (division_names,))
-        
-        devices = cursor.fetchall()
-        return [{"device_id": row[0], "device_name": row[1]} for row in devices]
+        devices = device_registry.devices_by_division_names(division_names)
+        return [{"device_id": device["device_id"], "device_name": device["device_name"]} for device in devices]
     except Exception as e:
         logger.error(f"Error fetching devices for divisions: {str(e)}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
-def publish_message_screenshot(device_name: str, screenshot_id: str):
+def build_screenshot_message(device_name, screenshot_id):
     data = {
         "device_name": device_name,
         "screenshot_id": screenshot_id
     }
-    
-    data_bytes = json.dumps(data).encode("utf-8")
-    future = publisher.publish(topic_path, data_bytes)
-    message_id = future.result()
+    return json.dumps(data).encode("utf-8")
 
-    return {"status": "Message published", "message_id": message_id}
+#publish screenshot requests concurrently; returns {screenshot_id: publish response}
+def publish_screenshot_messages(requests):
+    pending = {
+        publisher.publish(topic_path, build_screenshot_message(device_name, screenshot_id)): screenshot_id
+        for screenshot_id, device_name in requests
+    }
+    futures.wait(pending)
+
+    responses = {}
+    for future, screenshot_id in pending.items():
+        error = future.exception()
+        if error is None:
+            responses[screenshot_id] = {"status": "Message published", "message_id": future.result()}
+        else:
+            logger.error(f"Error publishing screenshot request {screenshot_id}: {error}")
+            responses[screenshot_id] = {"status": "Publish failed", "error": str(error)}
+    return responses
 
 def store_screenshot_request(device_id, interval_minutes=None, is_enabled=False):
     try:
@@ -118,6 +83,7 @@ def store_screenshot_request(device_id, interval_minutes=None, is_enabled=False)
                 """
                 cursor.execute(query, (device_id, interval_minutes, is_enabled, datetime.now()))
                 id = cursor.fetchone()[0]
+                notify_timers_changed(cursor, [device_id])
                 connection.commit()
                 return id
 
@@ -141,90 +107,130 @@ def process_device_timer(device_id: str, interval: int):
 
     return {"device_id": device_id, "device_name": device_name, "status": "Timer started", "interval_minutes": interval}
 
-def monitor_screenshots():
-    while True:
-        conn = None
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            current_time = datetime.now()
-
+#claim due auto-screenshot timers by advancing their timestamp; SKIP LOCKED keeps
+#concurrent monitors (other workers/instances) from claiming the same device
+def claim_due_screenshot_timers(cursor, current_time, device_ids=None):
+    query = f"""
+    UPDATE auto_screenshot a
+    SET timestamp = %s
+    FROM (
+        SELECT id FROM auto_screenshot
+        WHERE is_enabled = TRUE
+        AND timestamp IS NOT NULL
+        AND timestamp + make_interval(mins => interval_minutes) <= %s
+        {"AND device_id = ANY(%s)" if device_ids is not None else ""}
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE a.id = due.id
+    RETURNING a.device_id, a.timestamp, a.interval_minutes;
+    """
+    params = (current_time, current_time) if device_ids is None else (current_time, current_time, list(device_ids))
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+#enabled timers as (device_id, last fired, interval_minutes), optionally only for some devices
+def fetch_screenshot_timers(device_ids=None):
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
             query = """
-            SELECT device_id, interval_minutes, timestamp 
-            FROM auto_screenshot 
-            WHERE is_enabled = TRUE;
+            SELECT device_id, timestamp, interval_minutes
+            FROM auto_screenshot
+            WHERE is_enabled = TRUE AND timestamp IS NOT NULL
             """
-            cursor.execute(query)
-            records = cursor.fetchall()
-            print(f"Found {len(records)} timed screenshot")
-
-            for device_id, interval_minutes, timestamp in records:
-                if timestamp is None:
-                    continue
-
-                next_screenshot_time = timestamp + timedelta(minutes=interval_minutes)
-                if current_time >= next_screenshot_time:
-                    screenshot_id = store_screenshot_request_screenshots(device_id)
-                    if screenshot_id:
-                        device_name = get_device_name(device_id)
-
-                        if publish_message_screenshot(device_name, screenshot_id):
-                            if update_timestamp(device_id):
-
-                                if update_screenshot(screenshot_id):
-                                    print("Screenshot updated")
-                                else:
-                                    print("Error updating screenshot")
-                            else:
-                                print("Error updating timestamp")
-
-                        else:
-                            print("Error publishing message")
-
-            conn.commit()
-        except Exception as e:
-            print(f"Error in monitoring: {str(e)}")
-        finally:
-            if conn:
-                cursor.close()
-                conn.close()
-        
-def update_timestamp(device_id):
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        query = """UPDATE auto_screenshot SET timestamp = %s WHERE device_id = %s;"""
-        cursor.execute(query, (datetime.now(),device_id,))
-        conn.commit()
-        
-        return cursor.rowcount > 0 
-    except Exception as e:
-        logger.error(f"Error updating screenshot timestamp: {str(e)}", exc_info=True)
-        return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+            if device_ids is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query + " AND device_id = ANY(%s)", (list(device_ids),))
+            return cursor.fetchall()
 
 def get_all_devices():
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        query = "SELECT device_id, device_name FROM devices;"
-        cursor.execute(query)
-        
-        devices = cursor.fetchall()
-        return [{"device_id": row[0], "device_name": row[1]} for row in devices]
+        devices = device_registry.all_devices()
+        return [{"device_id": device["device_id"], "device_name": device["device_name"]} for device in devices]
     except Exception as e:
         logger.error(f"Error fetching all devices: {str(e)}")
         return []
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
\ No newline at end of file
+
+#capture screenshots for many devices with one (cached) name lookup, one multi-row insert,
+#concurrent publishing and one update of the published rows
+def capture_device_screenshots(device_ids):
+    device_ids = list(dict.fromkeys(device_ids))
+    device_names = {device_id: device["device_name"] for device_id, device in device_registry.get_many(device_ids).items()}
+
+    missing = [device_id for device_id in device_ids if device_id not in device_names]
+    if missing:
+        logger.error(f"Device IDs not found in the database: {missing}")
+    if not device_names:
+        return []
+
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            stored = execute_values(
+                cursor,
+                "INSERT INTO screenshots (device_id) VALUES %s RETURNING id, device_id",
+                [(device_id,) for device_id in device_ids if device_id in device_names],
+                page_size=len(device_names),
+                fetch=True
+            )
+
+    # The screenshot rows are committed before devices are asked to upload against them
+    requests = [(screenshot_id, device_names[device_id]) for screenshot_id, device_id in stored]
+    publish_responses = publish_screenshot_messages(requests)
+
+    published_ids = [screenshot_id for screenshot_id, response in publish_responses.items() if "message_id" in response]
+    if published_ids:
+        with get_db_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE screenshots SET ispublished = TRUE WHERE id = ANY(%s)", (published_ids,))
+
+    return [
+        {
+            "device_name": device_name,
+            "screenshot_id": screenshot_id,
+            "publish_response": publish_responses[screenshot_id]
+        }
+        for screenshot_id, device_name in requests
+    ]
+
+def fetch_screenshot_details():
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            query = """
+            SELECT s.id, s.device_id, d.os_type, s.file_name, s.storage_url, s.timestamp, 
+                   COALESCE(a.interval_minutes, 0), COALESCE(a.is_enabled, false)
+            FROM screenshots s
+            JOIN devices d ON s.device_id = d.device_id
+            LEFT JOIN auto_screenshot a ON s.device_id = a.device_id
+            ORDER BY s.timestamp DESC;
+            """
+            cursor.execute(query)
+            return cursor.fetchall()
+
+def start_all_timers(interval_minutes: int):
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            query = """
+            UPDATE auto_screenshot 
+            SET interval_minutes = %s, is_enabled = TRUE, timestamp = %s
+            RETURNING device_id;
+            """
+            cursor.execute(query, (interval_minutes, datetime.now()))
+            rows = cursor.fetchall()
+            notify_timers_changed(cursor)
+            return rows
+
+def stop_timers(device_ids=None, division_names=None, stop_all=False):
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            if stop_all:
+                query = """ UPDATE auto_screenshot SET is_enabled = FALSE RETURNING id, device_id; """
+                cursor.execute(query)
+            else:
+                if division_names:
+                    division_devices = get_devices_by_division_names(division_names)
+                    device_ids = [device["device_id"] for device in division_devices]
+                query = """ UPDATE auto_screenshot SET is_enabled = FALSE WHERE device_id = ANY(%s) RETURNING id, device_id; """
+                cursor.execute(query, (device_ids,))
+            rows = cursor.fetchall()
+            notify_timers_changed(cursor, None if stop_all else [row[1] for row in rows])
+            return rows
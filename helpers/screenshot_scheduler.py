@@ -0,0 +1,88 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from config import SCREENSHOT_RECONCILE_INTERVAL, SCREENSHOT_RETRY_BASE_SECONDS, SCREENSHOT_RETRY_MAX_SECONDS
+from helpers.due_scheduler import DueScheduler
+from helpers.notification_helper import get_db_connection
+from helpers.screenshot_helper import SCREENSHOT_TIMER_CHANNEL, capture_device_screenshots, claim_due_screenshot_timers, fetch_screenshot_timers
+
+logger = logging.getLogger(__name__)
+
+
+#epoch seconds at which a timer next fires; timestamps are stored as naive local time
+def _next_due(last_fired, interval_minutes):
+    return (last_fired + timedelta(minutes=interval_minutes)).timestamp()
+
+
+class ScreenshotScheduler(DueScheduler):
+    """Takes automatic screenshots when device timers fall due.
+
+    NOTIFYs on SCREENSHOT_TIMER_CHANNEL carry the device ids whose timers were
+    started or stopped ('' means every timer may have changed). Every device due at
+    the same moment is claimed in one statement and captured as one batch. A due
+    device whose timer row is locked by a peer is retried with exponential backoff
+    instead of straight away.
+    """
+
+    channel = SCREENSHOT_TIMER_CHANNEL
+    name = "screenshot scheduler"
+
+    def __init__(self, reconcile_interval=SCREENSHOT_RECONCILE_INTERVAL):
+        super().__init__(reconcile_interval)
+        self._retries = {}  # device_id -> consecutive claims lost to a peer
+
+    def _reconcile(self):
+        timers = fetch_screenshot_timers()
+        self._reset_heap((_next_due(last_fired, interval), device_id) for device_id, last_fired, interval in timers)
+        logger.info(f"Screenshot scheduler tracking {len(self._due)} timers")
+
+    def _refresh(self, device_ids):
+        timers = {device_id: (last_fired, interval) for device_id, last_fired, interval in fetch_screenshot_timers(device_ids)}
+        for device_id in device_ids:
+            if device_id in timers:
+                self._schedule(device_id, _next_due(*timers[device_id]))
+            else:
+                self._unschedule(device_id)
+
+    def _notified(self, device_ids):
+        if "" in device_ids:
+            self._reconcile()
+        else:
+            self._refresh(device_ids)
+
+    # A device that is still due after the refresh is locked by a peer that has not
+    # committed yet; re-selecting it at its old due time would spin until it does.
+    def _back_off(self, device_ids):
+        now = time.time()
+        for device_id in device_ids:
+            due_at = self._due.get(device_id)
+            if due_at is None or due_at > now:
+                self._retries.pop(device_id, None)
+                continue
+            retries = self._retries.get(device_id, 0)
+            self._retries[device_id] = retries + 1
+            self._schedule(device_id, now + min(SCREENSHOT_RETRY_BASE_SECONDS * 2 ** retries, SCREENSHOT_RETRY_MAX_SECONDS))
+
+    # Every scheduler process tracks the same timers; claiming with SKIP LOCKED means
+    # each due device is captured by exactly one of them.
+    def _fire(self, device_ids):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                claimed = claim_due_screenshot_timers(cursor, datetime.now(), device_ids)
+
+        for device_id, last_fired, interval in claimed:
+            self._retries.pop(device_id, None)
+            self._schedule(device_id, _next_due(last_fired, interval))
+        claimed_ids = [row[0] for row in claimed]
+        unclaimed = set(device_ids) - set(claimed_ids)
+        if unclaimed:
+            self._refresh(unclaimed)
+            self._back_off(unclaimed)
+
+        if claimed_ids:
+            logger.info(f"Capturing {len(claimed_ids)} timed screenshots")
+            capture_device_screenshots(claimed_ids)
+
+#take automatic screenshots for enabled timers
+def monitor_screenshots():
+    ScreenshotScheduler().run_forever()
@@ -0,0 +1,61 @@
+import math
+
+# DDSketch-style latency sketch. A value v lands in bin ceil(log(v) / log(GAMMA)), and any
+# value in a bin is reported as that bin's midpoint, which is within RELATIVE_ACCURACY of the
+# true value. Bin counts are plain sums, so sketches for any set of time buckets, priorities
+# or divisions merge exactly by adding counts per bin.
+#
+# The stored bins in ack_latency_sketch_bins depend on these constants; changing them
+# requires `python -m helpers.rollup_helper rebuild`.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_VALUE = 0.001  # seconds; anything faster is counted as 1ms
+
+
+def bin_for(value):
+    return math.ceil(math.log(max(value, MIN_VALUE)) / LOG_GAMMA)
+
+
+def bin_value(index):
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class LatencySketch:
+    def __init__(self, bins=None):
+        self.bins = dict(bins or {})
+
+    @property
+    def count(self):
+        return sum(self.bins.values())
+
+    def add(self, value, count=1):
+        index = bin_for(value)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def add_bin(self, index, count):
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.add_bin(index, count)
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return bin_value(index)
+        return bin_value(max(self.bins))
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        result = {"count": self.count}
+        for q in quantiles:
+            value = self.quantile(q)
+            result[f"p{int(round(q * 100))}"] = round(value, 3) if value is not None else None
+        return result
@@ -1,8 +1,7 @@
-from constants import TokenParams
-from jose import jwt
+from helpers.auth_helper import decode_token_cached
 
 def get_username(token = str):
-    payload = jwt.decode(token, TokenParams.SECRETE_KEY, algorithms=[TokenParams.ALGORITHM])
+    payload = decode_token_cached(token)
     
     username = payload.get("sub")
     return username
\ No newline at end of file
@@ -0,0 +1,66 @@
+import logging
+from config import WORKFLOW_CLAIM_BATCH_SIZE, WORKFLOW_RECONCILE_INTERVAL
+from helpers.due_scheduler import DueScheduler
+from helpers.notification_helper import WORKFLOW_CHANNEL, get_db_connection, enqueue_due_workflows
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowDispatcher(DueScheduler):
+    """Moves live workflows into the notification outbox when they fall due.
+
+    NOTIFYs on WORKFLOW_CHANNEL carry the id of a created/updated workflow, whose
+    due time is then re-read.
+    """
+
+    channel = WORKFLOW_CHANNEL
+    name = "workflow dispatcher"
+
+    def __init__(self, reconcile_interval=WORKFLOW_RECONCILE_INTERVAL):
+        super().__init__(reconcile_interval)
+
+    def _reconcile(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT unique_id, time
+                    FROM workflow
+                    WHERE published = FALSE AND status = 'live' AND fanout_pending = FALSE
+                """)
+                rows = cursor.fetchall()
+
+        self._reset_heap((due.timestamp(), workflow_id) for workflow_id, due in rows)
+        logger.info(f"Workflow dispatcher tracking {len(self._due)} pending workflows")
+
+    def _refresh(self, workflow_ids):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT unique_id, time
+                    FROM workflow
+                    WHERE unique_id = ANY(%s) AND published = FALSE AND status = 'live' AND fanout_pending = FALSE
+                """, (list(workflow_ids),))
+                pending = dict(cursor.fetchall())
+
+        for workflow_id in workflow_ids:
+            if workflow_id in pending:
+                self._schedule(workflow_id, pending[workflow_id].timestamp())
+            else:
+                self._unschedule(workflow_id)
+
+    def _notified(self, workflow_ids):
+        self._refresh(workflow_ids)
+
+    # Every dispatcher process hears the same notifications; claiming with SKIP LOCKED
+    # means each due workflow is queued by exactly one of them.
+    def _fire(self, workflow_ids):
+        while True:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    claimed = enqueue_due_workflows(cursor, workflow_ids)
+            if len(claimed) < WORKFLOW_CLAIM_BATCH_SIZE:
+                break
+
+#handle scheduled workflows
+def process_scheduled_notifications():
+    WorkflowDispatcher().run_forever()
@@ -13,8 +13,17 @@ from controllers.FAQs.FAQs_controller import router as FAQs
 from controllers.Help_Support.help_support_controller import router as help_support
 
 import threading
-from helpers.notification_helper import process_scheduled_notifications
-from helpers.screenshot_helper import monitor_screenshots
+from config import RUN_BACKGROUND_WORKERS
+from helpers.ack_helper import ack_buffer
+from helpers.auth_helper import get_ldap_pool_stats
+from helpers.contact_mirror import contact_mirror
+from helpers.credential_helper import get_credential_stats
+from helpers.device_registry import device_registry
+from helpers.notification_helper import get_db_pool_stats
+from helpers.fanout_worker import process_fanout_jobs
+from helpers.outbox_worker import process_notification_outbox
+from helpers.workflow_dispatcher import process_scheduled_notifications
+from helpers.screenshot_scheduler import monitor_screenshots
 
 app = FastAPI()
 
@@ -51,5 +60,34 @@ app.include_router(help_support)
 def read_root():
     return {"message": "API is running."}
 
-threading.Thread(target=process_scheduled_notifications, daemon=True).start()
-threading.Thread(target=monitor_screenshots, daemon=True).start()
+@app.get("/health/db-pool")
+def db_pool_stats():
+    return {"db_pool": get_db_pool_stats()}
+
+@app.get("/health/ldap-pool")
+def ldap_pool_stats():
+    return {"ldap_pool": get_ldap_pool_stats()}
+
+@app.get("/health/contact-mirror")
+def contact_mirror_stats():
+    return {"contact_mirror": contact_mirror.stats()}
+
+@app.get("/health/credentials")
+def credential_stats():
+    return {"credentials": get_credential_stats()}
+
+@app.get("/health/device-registry")
+def device_registry_stats():
+    return {"device_registry": device_registry.stats()}
+
+@app.get("/health/acks")
+def ack_buffer_stats():
+    return {"ack_buffer": ack_buffer.stats()}
+
+# Background workers claim their rows in the database, so they are safe to run in every
+# process; RUN_BACKGROUND_WORKERS=false keeps a process API-only.
+if RUN_BACKGROUND_WORKERS:
+    threading.Thread(target=process_scheduled_notifications, daemon=True).start()
+    threading.Thread(target=process_notification_outbox, daemon=True).start()
+    threading.Thread(target=process_fanout_jobs, daemon=True).start()
+    threading.Thread(target=monitor_screenshots, daemon=True).start()
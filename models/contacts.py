@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 
 class CreateContactRequest(BaseModel):
@@ -13,6 +13,11 @@ class Contact(BaseModel):
     device_id: Optional[str] = None
     device_type: Optional[str] = None
 
+class ContactPage(BaseModel):
+    contacts: List[Contact]
+    total: int
+    next_cursor: Optional[str] = None
+
 class UpdateContactRequest(BaseModel):
     device_id: str
 
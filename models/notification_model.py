@@ -1,12 +1,13 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
 class Notification_type(str, Enum):
     SELECT = "User"
     GROUP = "Division"
     ALL = "All"
+    AUDIENCE = "Audience"
 
 class Workflow(BaseModel):
     body: str
@@ -17,6 +18,7 @@ class Workflow(BaseModel):
     WorkflowType: str
     NotificationType: Notification_type
     timestamp: Optional[datetime] = None
+    audience: Optional[Dict[str, Any]] = None
 
 class DivisionCreateRequest(BaseModel):
     Division_name: str
@@ -31,3 +33,14 @@ class WorkflowUpdate(BaseModel):
     NotificationType: Optional[Notification_type] = None
     ids: Optional[List[str]] = None
     timestamp: Optional[datetime] = None
+    audience: Optional[Dict[str, Any]] = None
+
+class DeviceAck(BaseModel):
+    workflow_id: str
+    device_id: str
+
+class DeviceAckBatch(BaseModel):
+    acks: List[DeviceAck]
+
+class AudiencePreviewRequest(BaseModel):
+    audience: Dict[str, Any]
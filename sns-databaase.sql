@@ -168,4 +168,181 @@ ADD COLUMN interval_minutes INT NOT NULL DEFAULT 5 CHECK (interval_minutes > 0);
 ALTER TABLE public.auto_screenshot 
 ADD COLUMN is_enabled BOOLEAN NOT NULL DEFAULT TRUE;
 
-https://chatgpt.com/share/67d045f8-b7f8-8004-8607-ce727b089514
\ No newline at end of file
+-- Transactional outbox: one row per device message, delivered and retried by the outbox worker
+CREATE TABLE public.notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    workflow_id VARCHAR(50) NOT NULL REFERENCES public.workflow(unique_id) ON DELETE CASCADE,
+    device_id VARCHAR(255) NOT NULL,
+    state VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'sent', 'dead')),
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    sent_at TIMESTAMP WITH TIME ZONE,
+    UNIQUE (workflow_id, device_id)
+);
+
+CREATE INDEX notification_outbox_pending_idx ON public.notification_outbox (next_attempt_at) WHERE state = 'pending';
+CREATE INDEX notification_outbox_dead_idx ON public.notification_outbox (id) WHERE state = 'dead';
+
+-- Background fan-out: the workflow is held back from dispatch until its job has built every device_workflows row
+ALTER TABLE public.workflow
+  ADD COLUMN fanout_pending BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE TABLE public.workflow_fanout_jobs (
+    job_id VARCHAR(50) PRIMARY KEY DEFAULT gen_random_uuid(),
+    workflow_id VARCHAR(50) NOT NULL REFERENCES public.workflow(unique_id) ON DELETE CASCADE,
+    notification_type VARCHAR(50) NOT NULL,
+    target_ids VARCHAR(255)[],
+    state VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'running', 'done', 'failed')),
+    last_key VARCHAR(255) NOT NULL DEFAULT '',
+    rows_materialised INT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX workflow_fanout_jobs_open_idx ON public.workflow_fanout_jobs (created_at) WHERE state IN ('pending', 'running');
+
+-- Workflow history: keyset pagination on (time, unique_id) plus the filterable columns
+CREATE INDEX workflow_time_id_idx ON public.workflow (time DESC, unique_id DESC);
+CREATE INDEX workflow_status_time_id_idx ON public.workflow (status, time DESC, unique_id DESC);
+CREATE INDEX workflow_priority_time_id_idx ON public.workflow (priority, time DESC, unique_id DESC);
+CREATE INDEX workflow_notification_type_time_id_idx ON public.workflow (notification_type, time DESC, unique_id DESC);
+CREATE INDEX workflow_unpublished_time_id_idx ON public.workflow (time DESC, unique_id DESC) WHERE published = FALSE;
+
+-- Delivery rollups (sent / acked / dead-lettered) per bucket x priority x workflow_type x division x device_type,
+-- maintained incrementally by helpers/rollup_helper.py; rebuild with `python -m helpers.rollup_helper rebuild`
+CREATE TABLE public.delivery_rollup_hourly (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    priority VARCHAR(10) NOT NULL DEFAULT '',
+    workflow_type VARCHAR(10) NOT NULL,
+    division VARCHAR(255) NOT NULL DEFAULT '',
+    device_type VARCHAR(255) NOT NULL DEFAULT '',
+    sent BIGINT NOT NULL DEFAULT 0,
+    acked BIGINT NOT NULL DEFAULT 0,
+    failed BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, priority, workflow_type, division, device_type)
+);
+
+CREATE TABLE public.delivery_rollup_daily (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    priority VARCHAR(10) NOT NULL DEFAULT '',
+    workflow_type VARCHAR(10) NOT NULL,
+    division VARCHAR(255) NOT NULL DEFAULT '',
+    device_type VARCHAR(255) NOT NULL DEFAULT '',
+    sent BIGINT NOT NULL DEFAULT 0,
+    acked BIGINT NOT NULL DEFAULT 0,
+    failed BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, priority, workflow_type, division, device_type)
+);
+
+CREATE INDEX delivery_rollup_daily_priority_idx ON public.delivery_rollup_daily (priority, bucket);
+CREATE INDEX delivery_rollup_daily_workflow_type_idx ON public.delivery_rollup_daily (workflow_type, bucket);
+
+-- Ack latency sketches: DDSketch-style bin counts per hour x priority x division (see helpers/sketch_helper.py);
+-- any range is answered by summing counts per bin
+CREATE TABLE public.ack_latency_sketch_bins (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    priority VARCHAR(10) NOT NULL DEFAULT '',
+    division VARCHAR(255) NOT NULL DEFAULT '',
+    bin INT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, priority, division, bin)
+);
+
+-- Ack ingestion joins batches of (workflow_id, device_id) pairs against device_workflows
+CREATE INDEX device_workflows_workflow_device_idx ON public.device_workflows (workflow_id, device_id);
+
+-- Recipient and ack counters kept on the workflow row (set by the fan-out paths, bumped by
+-- the ack flusher) so lists can show delivery percentages without counting device_workflows.
+-- Paginated ack reads use device_workflows_workflow_device_idx, whose leading column is workflow_id.
+ALTER TABLE public.workflow
+  ADD COLUMN recipients_total INT NOT NULL DEFAULT 0,
+  ADD COLUMN recipients_acked INT NOT NULL DEFAULT 0;
+
+UPDATE public.workflow w
+SET recipients_total = c.total, recipients_acked = c.acked
+FROM (
+    SELECT workflow_id, COUNT(*) AS total, COUNT(*) FILTER (WHERE ack) AS acked
+    FROM public.device_workflows
+    GROUP BY workflow_id
+) c
+WHERE w.unique_id = c.workflow_id;
+
+-- Re-sending to devices that have not acked: the partial index keeps finding the (usually few)
+-- unacked rows of a huge workflow cheap, and resends caps how often one message is repeated
+CREATE INDEX device_workflows_unacked_idx ON public.device_workflows (workflow_id, device_id) WHERE ack IS NOT TRUE;
+
+ALTER TABLE public.notification_outbox
+  ADD COLUMN resends INT NOT NULL DEFAULT 0;
+
+-- Audience targeting: workflows may target an attribute expression resolved by the in-memory
+-- audience index, which re-reads devices whose updated_at moved (membership changes included)
+ALTER TABLE public.workflow DROP CONSTRAINT workflow_notification_type_check;
+ALTER TABLE public.workflow ADD CONSTRAINT workflow_notification_type_check
+  CHECK (notification_type IN ('Single', 'Division', 'Multi Select', 'All', 'Audience'));
+
+ALTER TABLE public.devices
+  ADD COLUMN updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+
+CREATE INDEX devices_updated_at_idx ON public.devices (updated_at);
+
+CREATE FUNCTION public.touch_device_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER devices_touch_updated_at
+  BEFORE UPDATE ON public.devices
+  FOR EACH ROW EXECUTE FUNCTION public.touch_device_updated_at();
+
+CREATE FUNCTION public.touch_device_membership() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE public.devices SET updated_at = now() WHERE device_id = OLD.device_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE public.devices SET updated_at = now() WHERE device_id = NEW.device_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER division_devices_touch_device
+  AFTER INSERT OR UPDATE OR DELETE ON public.division_devices
+  FOR EACH ROW EXECUTE FUNCTION public.touch_device_membership();
+
+-- One recipient row per (workflow, device). A fan-out job taken over from a stalled worker
+-- can replay a chunk; its insert skips rows that already exist. The constraint's index also
+-- serves the ack and pagination lookups, so the plain index on the same columns is dropped.
+DELETE FROM public.device_workflows a
+USING public.device_workflows b
+WHERE a.workflow_id = b.workflow_id AND a.device_id = b.device_id AND a.id > b.id;
+
+ALTER TABLE public.device_workflows
+  ADD CONSTRAINT device_workflows_workflow_device_key UNIQUE (workflow_id, device_id);
+
+DROP INDEX public.device_workflows_workflow_device_idx;
+
+-- Fan-out jobs that fail are retried with backoff instead of being left failed; jobs that
+-- failed before retries existed are queued again, so their workflows are sent.
+ALTER TABLE public.workflow_fanout_jobs
+  ADD COLUMN attempts INT NOT NULL DEFAULT 0,
+  ADD COLUMN next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+
+UPDATE public.workflow_fanout_jobs SET state = 'pending' WHERE state = 'failed';
+
+CREATE INDEX workflow_fanout_jobs_retry_idx ON public.workflow_fanout_jobs (next_attempt_at) WHERE state = 'pending';
+
+-- Contacts deleted from LDAP, read by every process's contact mirror on its incremental
+-- refresh (a deleted entry has no modifyTimestamp to search for); pruned as it is written
+CREATE TABLE public.contact_deletions (
+    id BIGSERIAL PRIMARY KEY,
+    dn TEXT NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX contact_deletions_deleted_at_idx ON public.contact_deletions (deleted_at);
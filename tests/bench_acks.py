@@ -0,0 +1,102 @@
+"""Sustained ack ingestion against a local Postgres.
+
+    TEST_DATABASE_URL=postgresql://... python -m tests.bench_acks [--workflows 20] [--devices 5000]
+
+Seeds workflows x devices recipient rows (wiping the test database first), then
+`--clients` concurrent clients post batches of `--batch` acks to the ack endpoint,
+backing off briefly on a 503. Every ack is sent twice, so the replayed half checks
+that ingestion is idempotent. Reports acks/sec accepted and written.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from tests.support import configure_environment, database_url, load_schema, reset_data, seed_workflows
+
+configure_environment()
+
+import psycopg2  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from controllers.notifications.notification_controller import acknowledge_workflows  # noqa: E402
+from helpers.ack_helper import ack_buffer  # noqa: E402
+from models.notification_model import DeviceAck, DeviceAckBatch  # noqa: E402
+
+
+async def _client(batches, retry_after=0.01):
+    rejected = 0
+    for batch in batches:
+        while True:
+            try:
+                await acknowledge_workflows(batch)
+                break
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                rejected += 1
+                await asyncio.sleep(retry_after)
+    return rejected
+
+
+async def _post(acks, clients, batch_size):
+    batches = [
+        DeviceAckBatch(acks=[DeviceAck(workflow_id=w, device_id=d) for w, d in acks[i:i + batch_size]])
+        for i in range(0, len(acks), batch_size)
+    ]
+    rejected = await asyncio.gather(*(_client(batches[c::clients]) for c in range(clients)))
+    return sum(rejected)
+
+
+def _wait_until_applied(total, timeout=300):
+    deadline = time.monotonic() + timeout
+    while ack_buffer.stats()["applied"] < total:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"only {ack_buffer.stats()['applied']} of {total} acks were written")
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workflows", type=int, default=20)
+    parser.add_argument("--devices", type=int, default=5000, help="recipients per workflow")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100, help="acks per request")
+    args = parser.parse_args()
+
+    url = database_url()
+    if not url:
+        sys.exit("TEST_DATABASE_URL is not set")
+    conn = psycopg2.connect(url)
+    load_schema(conn)
+    reset_data(conn)
+    targets = seed_workflows(conn, args.workflows, args.devices)
+    acks = [(workflow_id, device_id) for workflow_id, device_ids in targets.items() for device_id in device_ids]
+    total = len(acks)
+
+    started = time.perf_counter()
+    rejected = asyncio.run(_post(acks, args.clients, args.batch))
+    accepted_in = time.perf_counter() - started
+    _wait_until_applied(total)
+    written_in = time.perf_counter() - started
+
+    # Replay every ack: nothing may be written twice.
+    rejected += asyncio.run(_post(acks, args.clients, args.batch))
+    _wait_until_applied(total)
+    ack_buffer.flush()
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FILTER (WHERE ack), COUNT(*) FROM device_workflows")
+        acked_rows, rows = cursor.fetchone()
+        cursor.execute("SELECT SUM(recipients_acked) FROM workflow")
+        counted = cursor.fetchone()[0]
+    conn.close()
+    stats = ack_buffer.stats()
+    assert acked_rows == rows == counted == stats["applied"] == total, (acked_rows, rows, counted, stats)
+
+    print(f"{total} acks from {args.clients} clients in batches of {args.batch}, each sent twice")
+    print(f"accepted: {total / accepted_in:10,.0f} acks/s  ({accepted_in:.2f}s)")
+    print(f"written:  {total / written_in:10,.0f} acks/s  ({written_in:.2f}s)")
+    print(f"flushes: {stats['flushes']}, 503 retries: {rejected}, replayed acks written: {stats['applied'] - total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-request auth overhead, before and after the cached auth dependency.
+
+    python -m tests.bench_auth [--requests 20000]
+
+"before" is what a route used to do: read the cookie, verify the JWT, then decode
+it again in get_username. "after" is get_current_user: one lookup in the
+verified-token cache, with the principal kept on request.state.
+"""
+import argparse
+import time
+from tests.support import configure_environment
+
+configure_environment()
+
+from starlette.requests import Request  # noqa: E402
+from helpers.auth_helper import create_access_token, decode_access_token, extract_token_from_cookies, get_current_user  # noqa: E402
+
+
+def _request(token):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"cookie", f"access_token={token}".encode())]})
+
+
+def read_cookie_only(request):
+    return request.cookies.get("access_token") and "bench-user"
+
+
+def authenticate_uncached(request):
+    token = extract_token_from_cookies(request)
+    decode_access_token(token)  # verify_jwt
+    return decode_access_token(token).get("sub")  # get_username
+
+
+def authenticate_cached(request):
+    return get_current_user(request).get("sub")
+
+
+def _measure(authenticate, token, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        assert authenticate(_request(token)) == "bench-user"
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "bench-user"})
+    baseline = _measure(read_cookie_only, token, args.requests)
+    before = _measure(authenticate_uncached, token, args.requests)
+    after = _measure(authenticate_cached, token, args.requests)
+
+    print(f"{args.requests} requests, one token")
+    print(f"request + cookie only:      {baseline * 1e6:8.1f} us/request")
+    print(f"before (decode twice):      {(before - baseline) * 1e6:8.1f} us/request auth overhead")
+    print(f"after  (cached dependency): {(after - baseline) * 1e6:8.1f} us/request auth overhead")
+    print(f"speed-up: {(before - baseline) / max(after - baseline, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
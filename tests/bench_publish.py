@@ -0,0 +1,63 @@
+"""Publish throughput against a local fake publisher, before and after batching.
+
+    python -m tests.bench_publish [--messages 2000] [--latency 0.002]
+
+"before" is the old dispatcher loop: publish one message and wait on its future
+before the next. "after" is publish_messages: publish everything, wait on all the
+futures together. The fake publisher charges `latency` per batch RPC.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from tests.support import FakePublisher, configure_environment, use_publisher
+
+configure_environment()
+
+from helpers import notification_helper  # noqa: E402
+
+
+def _messages(count):
+    now = datetime.now(timezone.utc)
+    return [
+        (i, notification_helper.build_message("bench-workflow", "Benchmark", "body", "P1", f"device-{i}", now))
+        for i in range(count)
+    ]
+
+
+def publish_serially(messages):
+    published = []
+    for key, data in messages:
+        notification_helper.publisher.publish(notification_helper.topic_name, data).result()
+        published.append(key)
+    return published, []
+
+
+def _measure(publish, messages):
+    started = time.perf_counter()
+    published, failed = publish(messages)
+    elapsed = time.perf_counter() - started
+    assert len(published) == len(messages) and not failed
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per fake batch RPC")
+    parser.add_argument("--batch-size", type=int, default=1000, help="messages per fake batch RPC")
+    args = parser.parse_args()
+
+    use_publisher(FakePublisher(latency=args.latency, max_messages=args.batch_size))
+    messages = _messages(args.messages)
+
+    before = _measure(publish_serially, messages)
+    after = _measure(notification_helper.publish_messages, messages)
+
+    print(f"{args.messages} messages, {args.latency * 1000:g} ms per batch RPC")
+    print(f"before (serial future.result()): {args.messages / before:12,.0f} msg/s  ({before:.3f}s)")
+    print(f"after  (publish_messages):       {args.messages / after:12,.0f} msg/s  ({after:.3f}s)")
+    print(f"speed-up: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
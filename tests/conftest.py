@@ -0,0 +1,33 @@
+import pytest
+from tests.support import configure_environment, database_url, load_schema, reset_data
+
+configure_environment()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """DSN of a freshly loaded test database; skips when TEST_DATABASE_URL is unset."""
+    url = database_url()
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+
+    conn = psycopg2.connect(url)
+    try:
+        load_schema(conn)
+    finally:
+        conn.close()
+    return url
+
+
+@pytest.fixture
+def db_conn(database):
+    """A direct connection to an emptied test database."""
+    import psycopg2
+
+    conn = psycopg2.connect(database)
+    reset_data(conn)
+    try:
+        yield conn
+    finally:
+        conn.close()
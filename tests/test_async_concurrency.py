@@ -0,0 +1,60 @@
+"""A long screenshot fan-out runs off the event loop, so other requests keep being served."""
+import asyncio
+import time
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("google.cloud.pubsub_v1")
+
+FANOUT_SECONDS = 1.0
+REQUESTS = 20
+
+
+def _slow_fanout(device_ids):
+    time.sleep(FANOUT_SECONDS)  # blocking, like the psycopg2 / Pub/Sub calls it stands in for
+    return [{"device_id": device_id, "status": "sent"} for device_id in device_ids]
+
+
+async def _heartbeat(stop, gaps, interval=0.01):
+    last = time.monotonic()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        gaps.append(now - last - interval)
+        last = now
+
+
+def test_requests_progress_during_a_long_fanout(monkeypatch):
+    from controllers.screenshot import screenshot_api
+
+    monkeypatch.setattr(screenshot_api, "capture_device_screenshots", _slow_fanout)
+    monkeypatch.setattr(screenshot_api, "fetch_screenshot_details", lambda: [])
+
+    async def scenario():
+        stop, gaps = asyncio.Event(), []
+        heartbeat = asyncio.ensure_future(_heartbeat(stop, gaps))
+
+        started = time.monotonic()
+        fanout = asyncio.ensure_future(screenshot_api.screenshot_active_window(device_ids=["d1", "d2"], division_names=[]))
+        await asyncio.sleep(0.05)  # let the fan-out reach its worker thread
+
+        finished = []
+        for response in await asyncio.gather(*(screenshot_api.get_screenshot_details() for _ in range(REQUESTS))):
+            assert response == {"screenshot_details": []}
+            finished.append(time.monotonic() - started)
+        assert not fanout.done()
+
+        result = await fanout
+        elapsed = time.monotonic() - started
+        stop.set()
+        await heartbeat
+        return result, finished, elapsed, max(gaps)
+
+    result, finished, elapsed, worst_gap = asyncio.run(scenario())
+
+    assert len(result["results"]) == 2
+    assert elapsed >= FANOUT_SECONDS
+    # Every other request was answered long before the fan-out finished...
+    assert max(finished) < FANOUT_SECONDS / 2
+    # ...and the event loop was never stalled for more than a fraction of it.
+    assert worst_gap < FANOUT_SECONDS / 4
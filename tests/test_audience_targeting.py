@@ -0,0 +1,67 @@
+"""Audience workflows only target devices that still exist."""
+import pytest
+from starlette.responses import Response
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("google.cloud.pubsub_v1")
+pytest.importorskip("ldap3")
+
+DEVICES = ["aud-1", "aud-2", "aud-3"]
+
+
+@pytest.fixture
+def stale_index(db_conn, monkeypatch):
+    """An audience index that still holds a device deleted after it was loaded."""
+    from helpers import audience_index
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO devices (device_id, device_name, os_type, device_type)
+            SELECT id, id, 'Windows', 'laptop' FROM unnest(%s::varchar[]) AS t(id)
+        """, (DEVICES,))
+    db_conn.commit()
+
+    index = audience_index.AudienceIndex()
+    monkeypatch.setattr(audience_index, "audience_index", index)
+    assert sorted(index.resolve({"field": "os_type", "eq": "Windows"})) == DEVICES
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("DELETE FROM devices WHERE device_id = 'aud-2'")
+    db_conn.commit()
+    return index
+
+
+def _workflow():
+    from models.notification_model import Workflow
+
+    return Workflow(
+        body="body", name="audience", priority=1, WorkflowType="immediate",
+        NotificationType="Audience", audience={"field": "os_type", "eq": "Windows"},
+    )
+
+
+def _recipients(conn, workflow_id):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT device_id FROM device_workflows WHERE workflow_id = %s ORDER BY device_id", (workflow_id,))
+        devices = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT recipients_total FROM workflow WHERE unique_id = %s", (workflow_id,))
+        return devices, cursor.fetchone()[0]
+
+
+def test_create_skips_deleted_devices(db_conn, stale_index):
+    from controllers.notifications.notification_controller import create_workflow
+
+    result = create_workflow(_workflow(), request=None, response=Response(), background=False, principal={})
+
+    assert _recipients(db_conn, result["workflow_id"]) == (["aud-1", "aud-3"], 2)
+
+
+def test_background_fanout_skips_deleted_devices(db_conn, stale_index):
+    from controllers.notifications.notification_controller import create_workflow
+    from helpers.fanout_worker import FanoutWorker
+
+    result = create_workflow(_workflow(), request=None, response=Response(), background=True, principal={})
+    worker = FanoutWorker()
+    worker.run_job(*worker._claim_job())
+
+    assert _recipients(db_conn, result["workflow_id"]) == (["aud-1", "aud-3"], 2)
@@ -0,0 +1,113 @@
+"""Contact mirrors in different processes see each other's deletions; contacts are indexed by device id."""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("ldap3")
+pytest.importorskip("google.cloud.pubsub_v1")
+
+CONTACTS_DN = "ou=contacts,dc=example,dc=com"
+
+
+class FakeDirectory:
+    """The contacts OU of an LDAP server, shared by every mirror in a test."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, username, email, device_id=None):
+        dn = f"cn={username},{CONTACTS_DN}"
+        self.entries[dn] = {
+            "cn": [username], "mail": [email], "ou": ["Ops"],
+            "employeeNumber": [device_id] if device_id else [],
+            "modifyTimestamp": datetime.now(timezone.utc),
+        }
+        return dn
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, directory):
+        self.directory = directory
+        self.response = []
+        self.extend = SimpleNamespace(standard=SimpleNamespace(paged_search=self._paged_search))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    # Every search returns the whole OU; the mirror only needs changed entries to be included
+    def _paged_search(self, base, search_filter, **kwargs):
+        return [{"type": "searchResEntry", "dn": dn, "attributes": dict(attrs)} for dn, attrs in self.directory.entries.items()]
+
+    def search(self, base, search_filter, search_scope=None, attributes=None):
+        attrs = self.directory.entries.get(base)
+        self.response = [{"type": "searchResEntry", "dn": base, "attributes": dict(attrs)}] if attrs else []
+        return attrs is not None
+
+
+@pytest.fixture
+def directory(db_conn, monkeypatch):
+    from helpers import contact_mirror
+
+    directory = FakeDirectory()
+    monkeypatch.setattr(contact_mirror, "connect_to_ldap", directory.connect)
+    monkeypatch.setattr(contact_mirror, "CONTACTS_DN", CONTACTS_DN)
+    return directory
+
+
+def _usernames(mirror):
+    contacts, _ = mirror.page(100)
+    return [contact["username"] for contact in contacts]
+
+
+def test_deletion_reaches_other_processes(directory):
+    from helpers.contact_mirror import ContactMirror
+
+    alice = directory.add("alice", "alice@example.com")
+    directory.add("bob", "bob@example.com")
+    here, elsewhere = ContactMirror(refresh_interval=0), ContactMirror(refresh_interval=0)
+    assert _usernames(here) == _usernames(elsewhere) == ["alice", "bob"]
+
+    del directory.entries[alice]
+    here.remove(alice)
+
+    assert _usernames(here) == ["bob"]
+    assert _usernames(elsewhere) == ["bob"]
+    assert elsewhere.get_by_email("alice@example.com") is None
+
+
+def test_recreated_contact_survives_its_old_deletion(directory):
+    from helpers.contact_mirror import ContactMirror
+
+    alice = directory.add("alice", "alice@example.com")
+    here, elsewhere = ContactMirror(refresh_interval=0), ContactMirror(refresh_interval=0)
+    assert _usernames(elsewhere) == ["alice"]
+
+    del directory.entries[alice]
+    here.remove(alice)
+    directory.add("alice", "alice@example.com")
+
+    assert _usernames(elsewhere) == ["alice"]
+
+
+def test_lookup_by_device_id(directory):
+    from helpers.contact_mirror import ContactMirror
+
+    directory.add("alice", "alice@example.com", device_id="dev-1")
+    directory.add("bob", "bob@example.com", device_id="dev-1")
+    carol = directory.add("carol", "carol@example.com", device_id="dev-2")
+    mirror = ContactMirror(refresh_interval=0)
+
+    assert sorted(contact["username"] for contact in mirror.get_by_device_id("dev-1")) == ["alice", "bob"]
+    assert [contact["username"] for contact in mirror.get_by_device_id("dev-2")] == ["carol"]
+
+    directory.entries[carol]["employeeNumber"] = ["dev-1"]
+    mirror.upsert(carol, {"cn": "carol", "mail": "carol@example.com", "ou": "Ops", "employeeNumber": "dev-1"})
+    assert mirror.get_by_device_id("dev-2") == []
+    assert len(mirror.get_by_device_id("dev-1")) == 3
@@ -0,0 +1,97 @@
+"""Several dispatcher and outbox processes share one database without duplicating work."""
+import multiprocessing
+from collections import Counter
+import pytest
+from tests.support import seed_workflows
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("google.cloud.pubsub_v1")
+
+PROCESSES = 4
+WORKFLOWS = 24
+DEVICES_PER_WORKFLOW = 150
+CLAIM_BATCH_SIZE = 2
+
+
+# Each child is a fresh interpreter (spawn), so it configures itself before importing the helpers.
+def _dispatch(url, start, results):
+    import os
+    os.environ["WORKFLOW_CLAIM_BATCH_SIZE"] = str(CLAIM_BATCH_SIZE)
+    from tests.support import configure_environment
+    configure_environment(url)
+
+    from helpers import workflow_dispatcher
+    from helpers.notification_helper import enqueue_due_workflows
+
+    claimed = []
+
+    def record(cursor, workflow_ids=None):
+        batch = enqueue_due_workflows(cursor, workflow_ids)
+        claimed.extend(batch)
+        return batch
+
+    workflow_dispatcher.enqueue_due_workflows = record
+
+    # One pass of run_forever: every process sees the same due workflows and fires them together.
+    dispatcher = workflow_dispatcher.WorkflowDispatcher()
+    dispatcher._reconcile()
+    start.wait()
+    dispatcher._fire(dispatcher._pop_due())
+    results.put(claimed)
+
+
+def _deliver(url, start, results):
+    from tests.support import FakePublisher, configure_environment, use_publisher
+    configure_environment(url)
+
+    from helpers.outbox_worker import OutboxWorker
+
+    publisher = FakePublisher()
+    use_publisher(publisher)
+    worker = OutboxWorker(batch_size=200)
+    start.wait()
+    while worker.deliver_batch():
+        pass
+    results.put([(message["notification_id"], message["device_id"]) for message in publisher.messages])
+
+
+def _run_processes(target, url):
+    context = multiprocessing.get_context("spawn")
+    start = context.Barrier(PROCESSES)
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(url, start, results)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    collected = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    return collected
+
+
+def test_each_device_gets_exactly_one_message(database, db_conn):
+    targets = seed_workflows(db_conn, WORKFLOWS, DEVICES_PER_WORKFLOW)
+
+    claimed = _run_processes(_dispatch, database)
+    claims = Counter(workflow_id for batch in claimed for workflow_id in batch)
+    assert set(claims) == set(targets)
+    assert max(claims.values()) == 1
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT workflow_id, device_id, COUNT(*) FROM notification_outbox GROUP BY 1, 2")
+        outbox = {(workflow_id, device_id): count for workflow_id, device_id, count in cursor.fetchall()}
+        cursor.execute("SELECT COUNT(*) FROM workflow WHERE published = FALSE")
+        unpublished = cursor.fetchone()[0]
+    expected = {(workflow_id, device_id) for workflow_id, device_ids in targets.items() for device_id in device_ids}
+    assert set(outbox) == expected
+    assert set(outbox.values()) == {1}
+    assert unpublished == 0
+
+    delivered = _run_processes(_deliver, database)
+    messages = Counter(message for batch in delivered for message in batch)
+    assert set(messages) == expected
+    assert set(messages.values()) == {1}
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("SELECT state, COUNT(*) FROM notification_outbox GROUP BY state")
+        assert dict(cursor.fetchall()) == {"sent": len(expected)}
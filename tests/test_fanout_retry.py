@@ -0,0 +1,86 @@
+"""A background fan-out job that fails is retried with backoff until its workflow is released."""
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("google.cloud.pubsub_v1")
+
+DEVICES = [f"fan-{i:03d}" for i in range(25)]
+
+
+@pytest.fixture
+def job(db_conn):
+    from helpers.notification_helper import create_fanout_job, insert_workflow
+    from models.notification_model import Workflow
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO devices (device_id, device_name, os_type, device_type)
+            SELECT id, id, 'linux', 'laptop' FROM unnest(%s::varchar[]) AS t(id)
+        """, (DEVICES,))
+        workflow = Workflow(body="body", name="fan-out", priority=1, WorkflowType="immediate", NotificationType="All")
+        workflow_id = insert_workflow(cursor, workflow, fanout_pending=True)
+        create_fanout_job(cursor, workflow_id, workflow)
+    db_conn.commit()
+    return workflow_id
+
+
+class _FailingChunks:
+    """Fails the first `failures` chunks, then lets them through."""
+
+    def __init__(self, materialise, failures):
+        self.materialise = materialise
+        self.failures = failures
+
+    def __call__(self, *args):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database went away")
+        return self.materialise(*args)
+
+
+def _state(conn, workflow_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT j.state, j.attempts, j.next_attempt_at > now(), w.fanout_pending, w.recipients_total
+            FROM workflow_fanout_jobs j JOIN workflow w ON w.unique_id = j.workflow_id
+            WHERE j.workflow_id = %s
+        """, (workflow_id,))
+        state = cursor.fetchone()
+    conn.commit()
+    return state
+
+
+def test_failed_job_is_retried(db_conn, job, monkeypatch):
+    from helpers.fanout_worker import FanoutWorker
+
+    worker = FanoutWorker(chunk_size=10)
+    monkeypatch.setattr(worker, "_materialise_chunk", _FailingChunks(worker._materialise_chunk, failures=1))
+
+    worker.run_job(*worker._claim_job())
+    assert _state(db_conn, job) == ("pending", 1, True, True, 0)
+    assert worker._claim_job() is None  # backing off
+    assert 0 < worker._wait_timeout()
+
+    with db_conn.cursor() as cursor:
+        cursor.execute("UPDATE workflow_fanout_jobs SET next_attempt_at = now() WHERE workflow_id = %s", (job,))
+    db_conn.commit()
+
+    worker.run_job(*worker._claim_job())
+    assert _state(db_conn, job) == ("done", 1, False, False, len(DEVICES))
+
+
+def test_job_gives_up_after_max_attempts(db_conn, job, monkeypatch):
+    from helpers import fanout_worker
+
+    monkeypatch.setattr(fanout_worker, "FANOUT_JOB_MAX_ATTEMPTS", 2)
+    worker = fanout_worker.FanoutWorker()
+    monkeypatch.setattr(worker, "_materialise_chunk", _FailingChunks(worker._materialise_chunk, failures=2))
+
+    for _ in range(2):
+        with db_conn.cursor() as cursor:
+            cursor.execute("UPDATE workflow_fanout_jobs SET next_attempt_at = now() WHERE workflow_id = %s", (job,))
+        db_conn.commit()
+        worker.run_job(*worker._claim_job())
+
+    assert _state(db_conn, job)[:2] == ("failed", 2)
+    assert worker._claim_job() is None
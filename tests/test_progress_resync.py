@@ -0,0 +1,56 @@
+"""A progress stream that keeps receiving local events still picks up changes from other processes."""
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("google.cloud.pubsub_v1")
+pytest.importorskip("ldap3")
+
+WORKFLOW_ID = "wf-progress"
+RESYNC_INTERVAL = 0.2
+
+
+class _ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_busy_stream_resyncs_on_deadline(monkeypatch):
+    from controllers.notifications import notification_controller
+    from helpers import progress_helper
+
+    # What the database reports; another process acks devices while the stream is busy
+    database = {"total": 1000, "published": 0, "acked": 0}
+    monkeypatch.setattr(progress_helper, "fetch_workflow_progress", lambda workflow_id: dict(database))
+    hub = progress_helper.ProgressHub(resync_interval=RESYNC_INTERVAL)
+    monkeypatch.setattr(notification_controller, "progress_hub", hub)
+
+    async def scenario():
+        response = await notification_controller.stream_workflow_progress(WORKFLOW_ID, request=_ConnectedRequest(), principal={})
+        stream = response.body_iterator
+
+        async def local_events():
+            while True:
+                hub.publish_sent([WORKFLOW_ID])
+                await asyncio.sleep(0.01)
+
+        producer = asyncio.ensure_future(local_events())
+        database["acked"] = 400
+        seen = []
+        try:
+            deadline = asyncio.get_running_loop().time() + RESYNC_INTERVAL * 5
+            while asyncio.get_running_loop().time() < deadline:
+                chunk = await stream.__anext__()
+                if chunk.startswith("data: "):
+                    seen.append(json.loads(chunk[len("data: "):])["counters"]["acked"])
+        finally:
+            producer.cancel()
+            await stream.aclose()
+        return seen
+
+    seen = asyncio.run(scenario())
+
+    assert seen[0] == 0  # the initial snapshot, before the other process's acks
+    assert 400 in seen  # reloaded although local events never stopped
+    assert hub.stats()["subscribers"] == 0
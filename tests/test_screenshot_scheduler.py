@@ -0,0 +1,56 @@
+"""A due screenshot timer locked by a peer scheduler is retried with backoff, not in a hot loop."""
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("google.cloud.pubsub_v1")
+
+DEVICE = "shot-1"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    from helpers import screenshot_scheduler
+
+    last_fired = datetime.now() - timedelta(minutes=10)
+    timers = {"claimed": []}
+    monkeypatch.setattr(screenshot_scheduler, "get_db_connection", mock.MagicMock())
+    monkeypatch.setattr(screenshot_scheduler, "claim_due_screenshot_timers", lambda cursor, now, device_ids: timers["claimed"])
+    monkeypatch.setattr(screenshot_scheduler, "fetch_screenshot_timers", lambda device_ids=None: [(DEVICE, last_fired, 5)])
+    monkeypatch.setattr(screenshot_scheduler, "capture_device_screenshots", lambda device_ids: None)
+    monkeypatch.setattr(screenshot_scheduler, "SCREENSHOT_RETRY_BASE_SECONDS", 0.5)
+    monkeypatch.setattr(screenshot_scheduler, "SCREENSHOT_RETRY_MAX_SECONDS", 1.5)
+
+    scheduler = screenshot_scheduler.ScreenshotScheduler()
+    scheduler._reconcile()
+    scheduler.timers = timers
+    return scheduler
+
+
+def _delay(scheduler):
+    return scheduler._due[DEVICE] - time.time()
+
+
+def test_locked_timer_backs_off(scheduler):
+    delays = []
+    for _ in range(4):
+        assert scheduler._pop_due() == [DEVICE]
+        scheduler._fire([DEVICE])  # a peer holds the row: nothing is claimed
+        delays.append(_delay(scheduler))
+        scheduler._due[DEVICE] = 0  # pretend the backoff elapsed
+        scheduler._heap = [(0, DEVICE)]
+
+    assert [round(delay, 1) for delay in delays] == [0.5, 1.0, 1.5, 1.5]
+
+
+def test_claim_resets_backoff(scheduler):
+    scheduler._fire(scheduler._pop_due())
+    assert scheduler._retries == {DEVICE: 1}
+
+    scheduler.timers["claimed"] = [(DEVICE, datetime.now(), 5)]
+    scheduler._fire([DEVICE])
+
+    assert scheduler._retries == {}
+    assert 299 < _delay(scheduler) <= 300